@@ -32,6 +32,14 @@ class DebuggerInterface:
         except Exception as e:
             self.handle_exception(e)
 
+    def break_execution(self):
+        """Tell a running debugger engine to break.
+        """
+        try:
+            self.runner.break_execution()
+        except Exception as e:
+            self.handle_exception(e)
+
     def run_to_cursor(self):
         """Run to the current VIM cursor position.
         """
@@ -64,6 +72,15 @@ class DebuggerInterface:
         except Exception as e:
             self.handle_exception(e)
 
+    def poll(self):
+        """Check for a response from a debugger engine that is running
+        in the background.
+        """
+        try:
+            self.runner.poll()
+        except Exception as e:
+            self.handle_exception(e)
+
     def handle_opt(self,option,value = None):
         """Set an option, overwriting the existing value.
         """
@@ -74,12 +91,49 @@ class DebuggerInterface:
                 self.runner.ui.say("Setting vdebug option '%s' to: %s"\
                                     %(option,value))
                 vim.command('let g:vdebug_options["%s"] = "%s"' %(option,value))
-                return vdebug.opts.Options.overwrite(option,value)
+                vdebug.opts.Options.overwrite(option,value)
+                if option == 'path_maps':
+                    vdebug.util.FilePath.clear_cache()
 
         except Exception as e:
             self.handle_exception(e)
 
 
+    def expand_tree(self,args = None):
+        """Expand the property under the cursor in the watch window, down
+        to the depth given in args.
+        """
+        try:
+            if args is None or len(args.strip()) == 0:
+                depth = vdebug.opts.Options.get('expand_depth',int)
+            else:
+                try:
+                    depth = int(args)
+                except ValueError:
+                    self.runner.ui.error(\
+                            "The depth to expand to must be a number")
+                    return False
+            return self.event_dispatcher.expand_tree(depth)
+        except Exception as e:
+            self.handle_exception(e)
+
+    def watch_search(self,pattern):
+        """Search the watch window for a regular expression, including
+        lines that aren't in the buffer.
+        """
+        try:
+            return self.event_dispatcher.search_watch(pattern)
+        except Exception as e:
+            self.handle_exception(e)
+
+    def handle_watch_cursor_moved(self):
+        """React to the cursor moving in the watch window.
+        """
+        try:
+            return self.runner.ui.watchwin.follow_cursor()
+        except Exception as e:
+            self.handle_exception(e)
+
     def handle_return_keypress(self):
         """React to a <enter> keypress event.
         """
@@ -232,6 +286,8 @@ class DebuggerInterface:
             self.handle_readable_error(e)
         elif isinstance(e,vdebug.log.LogError):
             self.handle_readable_error(e)
+        elif isinstance(e,vdebug.dbgp.EngineBusyError):
+            self.handle_readable_error(e)
         elif isinstance(e,vdebug.dbgp.DBGPError):
             self.handle_dbgp_error(e)
         elif isinstance(e,(EOFError,socket.error)):
@@ -1,31 +1,57 @@
 import base64
+import bisect
 import vdebug.log
 
 class Store:
+    """The breakpoints, by ID, with indexes of the line breakpoints by
+    file and line, and of the IDs in order."""
 
     def __init__(self):
         self.breakpoints = {}
+        self.locations = {}
+        self.files = {}
+        self.sorted_ids = []
         self.api = None
 
     def link_api(self,api):
+        """Use a debugger connection, and register all the breakpoints
+        with it at once.
+
+        Returns a list of (breakpoint, error) tuples for the breakpoints
+        that the debugger failed to set.
+        """
         self.api = api
         num_bps = len(self.breakpoints)
         if num_bps > 0:
             vdebug.log.Log("Registering %i breakpoints with the debugger" % num_bps)
-        for id, bp in self.breakpoints.iteritems():
-            res = self.api.breakpoint_set(bp.get_cmd())
-            bp.set_debugger_id(res.get_id())
-
-    # Update line-based breakpoints with a dict of IDs and lines
-    def update_lines(self,lines):
-        for id, line in lines.iteritems():
-            try:
-                self.breakpoints[id].set_line(line)
-                vdebug.log.Log("Updated line number of breakpoint %s to %s"\
-                                    %(str(id),str(line)) )
-            except ValueError:
-                pass
-                # No method set_line, not a line breakpoint
+        bps = self.breakpoints.values()
+        responses = self.api.breakpoint_set_batch(\
+                [bp.get_cmd() for bp in bps])
+        failures = []
+        for bp, res in zip(bps,responses):
+            if isinstance(res,Exception):
+                vdebug.log.Log("Failed to register %s: %s" %(bp,res),\
+                        vdebug.log.Logger.ERROR)
+                failures.append((bp,res))
+            else:
+                bp.set_debugger_id(res.get_id())
+        return failures
+
+    # Update line-based breakpoints with a dict of file names to dicts
+    # of IDs and lines
+    def update_lines(self,sign_lines):
+        for file, lines in sign_lines.iteritems():
+            ids = self.files.get(file,())
+            for id, line in lines.iteritems():
+                if id not in ids:
+                    continue
+                bp = self.breakpoints[id]
+                if bp.get_line() != line:
+                    self.__unindex(bp)
+                    bp.set_line(line)
+                    self.__index(bp)
+                    vdebug.log.Log("Updated line number of breakpoint %s to %s"\
+                                        %(str(id),str(line)) )
 
     def unlink_api(self):
         self.api = None
@@ -33,6 +59,7 @@ class Store:
     def add_breakpoint(self,breakpoint):
         vdebug.log.Log("Adding " + str(breakpoint))
         self.breakpoints[str(breakpoint.get_id())] = breakpoint
+        self.__index(breakpoint)
         breakpoint.on_add()
         if self.api is not None:
             res = self.api.breakpoint_set(breakpoint.get_cmd())
@@ -52,6 +79,7 @@ class Store:
             if dbg_id is not None:
                 self.api.breakpoint_remove(dbg_id)
         self.breakpoints[id].on_remove()
+        self.__unindex(self.breakpoints[id])
         del self.breakpoints[id]
 
     def clear_breakpoints(self):
@@ -60,19 +88,43 @@ class Store:
         self.breakpoints = {}
 
     def find_breakpoint(self,file,line):
-        found = None
-        for id, bp in self.breakpoints.iteritems():
-            if bp.type == "line":
-                if bp.get_file() == file and\
-                        bp.get_line() == line:
-                    found = bp.get_id()
-                    break
-        return found
+        """Get the ID of the line breakpoint at a file and line, or None."""
+        id = self.locations.get((str(file),int(line)))
+        if id is None:
+            return None
+        return self.breakpoints[id].get_id()
+
+    def get_file_breakpoints(self,file):
+        """Get the IDs of the breakpoints with lines in a file."""
+        return self.files.get(str(file),set())
 
     def get_sorted_list(self):
-        keys = self.breakpoints.keys()
-        keys.sort()
-        return map(self.breakpoints.get,keys)
+        return [self.breakpoints[str(id)] for id in self.sorted_ids]
+
+    def __index(self,bp):
+        id = str(bp.get_id())
+        bisect.insort(self.sorted_ids,bp.get_id())
+        if isinstance(bp,LineBreakpoint):
+            file = str(bp.get_file())
+            self.files.setdefault(file,set()).add(id)
+            if bp.type == "line":
+                self.locations[(file,int(bp.get_line()))] = id
+
+    def __unindex(self,bp):
+        id = str(bp.get_id())
+        i = bisect.bisect_left(self.sorted_ids,bp.get_id())
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == bp.get_id():
+            del self.sorted_ids[i]
+        if isinstance(bp,LineBreakpoint):
+            file = str(bp.get_file())
+            ids = self.files.get(file)
+            if ids is not None:
+                ids.discard(id)
+                if len(ids) == 0:
+                    del self.files[file]
+            location = (file,int(bp.get_line()))
+            if self.locations.get(location) == id:
+                del self.locations[location]
 
 class BreakpointError(Exception):
     pass
@@ -1,8 +1,15 @@
 import xml.etree.ElementTree as ET
+import xml.parsers.expat
 import socket
+import select
 import vdebug.log
 import base64
 import time
+import re
+import threading
+import collections
+import array
+import sys
 
 """ Response objects for the DBGP module."""
 
@@ -10,15 +17,86 @@ class Response:
     """Contains response data from a command made to the debugger."""
     ns = '{urn:debugger_protocol_v1}'
 
+    """ Whether the response is expected to be a root tag with only
+    text content, allowing the root attributes to be read without
+    parsing the XML """
+    simple = False
+    root_tag_regex = re.compile(r'<([a-zA-Z_][-a-zA-Z0-9_.:]*)'\
+            r'((?:\s+[a-zA-Z_][-a-zA-Z0-9_.:]*\s*=\s*'\
+            r'(?:"[^"<]*"|\'[^\'<]*\'))*)\s*(/?)>')
+    attr_regex = re.compile(r'([a-zA-Z_][-a-zA-Z0-9_.:]*)\s*=\s*'\
+            r'(?:"([^"]*)"|\'([^\']*)\')')
+    cdata_regex = re.compile(r'^(\s*)<!\[CDATA\[(.*?)\]\]>(\s*)$',re.S)
+
     def __init__(self,response,cmd,cmd_args,api):
         self.response = response
         self.cmd = cmd
         self.cmd_args = cmd_args
         self.xml = None
         self.api = api
-        if "<error" in self.response:
+        self.root = None
+        if self.simple:
+            self.root = self.__parse_root()
+        if self.root is None and "<error" in self.response:
             self.__parse_error()
 
+    def __parse_root(self):
+        """Read the attributes and text of the root tag, without
+        parsing the XML.
+
+        Returns a tuple of (attributes, text), or None if the response
+        has child elements (e.g. an error), entities or anything else
+        that needs a real XML parser."""
+        msg = self.response
+        pos = msg.find('<')
+        while pos != -1 and msg[pos+1:pos+2] == '?':
+            pos = msg.find('<',pos+1)
+        if pos == -1:
+            return None
+        close_pos = msg.rfind('</')
+        if close_pos < pos:
+            close_pos = len(msg)
+        match = self.root_tag_regex.match(str(msg[pos:close_pos]))
+        if match is None or '&' in match.group(2):
+            return None
+        attrs = {}
+        for (name, dquoted, squoted) in \
+                self.attr_regex.findall(match.group(2)):
+            attrs[name] = dquoted or squoted
+
+        if match.group(3) == '/':
+            if len(str(msg[pos+match.end():]).strip()) > 0:
+                return None
+            return (attrs, None)
+        closing = str(msg[close_pos:]).strip()
+        if closing != '</%s>' % match.group(1):
+            return None
+        text = str(msg[pos+match.end():close_pos])
+        if '<' in text:
+            if text.count('<![CDATA[') > 1:
+                return None
+            cdata = self.cdata_regex.match(text)
+            if cdata is None:
+                return None
+            text = ''.join(cdata.groups())
+        elif '&' in text:
+            return None
+        if len(text) == 0:
+            text = None
+        return (attrs, text)
+
+    def get_attribute(self,name):
+        """Get an attribute of the root element."""
+        if self.root is not None:
+            return self.root[0].get(name)
+        return self.as_xml().get(name)
+
+    def get_text(self):
+        """Get the text content of the root element."""
+        if self.root is not None:
+            return self.root[1]
+        return self.as_xml().text
+
     def __parse_error(self):
         """Parse an error message which has been returned
         in the response, then raise it as a DBGPError."""
@@ -56,7 +134,7 @@ class Response:
         whole object as a string and should be used for
         displaying.
         """
-        return self.response
+        return str(self.response)
 
     def as_xml(self):
         """Get the response as element tree XML.
@@ -64,7 +142,7 @@ class Response:
         Returns an xml.etree.ElementTree.Element object.
         """
         if self.xml == None:
-            self.xml = ET.fromstring(self.response)
+            self.xml = ET.fromstring(buffer(self.response))
             self.__determine_ns()
         return self.xml
 
@@ -88,9 +166,10 @@ class ContextNamesResponse(Response):
 
 class StatusResponse(Response):
     """Response object returned by the status command."""
+    simple = True
 
     def __str__(self):
-        return self.as_xml().get('status')
+        return self.get_attribute('status')
 
 class StackGetResponse(Response):
     """Response object used by the stack_get command."""
@@ -101,23 +180,43 @@ class StackGetResponse(Response):
 class ContextGetResponse(Response):
     """Response object used by the context_get command.
     
-    The property nodes are converted into ContextProperty
-    objects, which are much easier to use."""
+    The property nodes are stored in a PropertyTable, and
+    ContextProperty objects are used as views on to the table,
+    which are much easier to use."""
 
     def __init__(self,response,cmd,cmd_args,api):
         Response.__init__(self,response,cmd,cmd_args,api)
         self.properties = []
+        self.table = None
 
     def get_context(self):
+        self.table = self.create_table()
         for c in self.as_xml().getchildren():
-            self.create_properties(ContextProperty(c))
+            self.create_property(c,None,0,self.table)
 
+        self.properties = self.table.properties()
         return self.properties
 
-    def create_properties(self,property):
-        self.properties.append(property)
-        for p in property.children:
-            self.create_properties(p)
+    def iter_context(self):
+        """Iterate over the properties, in the same order as
+        get_context(), while the response is being parsed.
+
+        The XML tree is never built, and properties are only views on
+        to the property table, so they can be freed straight away.
+        Once the response has been parsed, the table is kept and
+        iterated over again instead of parsing a second time.
+        """
+        if self.table is not None:
+            return (self.table.view(i) for i in range(len(self.table)))
+        return ContextPropertyParser(self).parse()
+
+    def create_table(self):
+        """Create an empty table to hold the properties."""
+        return PropertyTable(ContextProperty)
+
+    def create_property(self,node,parent = None,depth = 0,table = None):
+        """Create a property object from a property node."""
+        return ContextProperty(node,parent,depth,table)
 
 class EvalResponse(ContextGetResponse):
     """Response object returned by the eval command."""
@@ -130,12 +229,15 @@ class EvalResponse(ContextGetResponse):
             else:
                 raise e
 
-    def get_context(self):
-        code = self.get_code()
-        for c in self.as_xml().getchildren():
-            self.create_properties(EvalProperty(c,code,self.api.language))
+    def create_table(self):
+        return PropertyTable(EvalProperty,self.get_code(),\
+                self.api.language)
 
-        return self.properties
+    def create_property(self,node,parent = None,depth = 0,table = None):
+        if table is None:
+            table = self.create_table()
+        return EvalProperty(node,table.code,table.language,parent,depth,\
+                table)
 
     def get_code(self):
         cmd = self.get_cmd_args()
@@ -145,25 +247,25 @@ class EvalResponse(ContextGetResponse):
 
 class BreakpointSetResponse(Response):
     """Response object returned by the breakpoint_set command."""
+    simple = True
 
     def get_id(self):
-        return int(self.as_xml().get('id'))
+        return int(self.get_attribute('id'))
 
     def __str__(self):
-        return self.as_xml().get('id')
+        return self.get_attribute('id')
 
 class FeatureGetResponse(Response):
     """Response object specifically for the feature_get command."""
+    simple = True
 
     def is_supported(self):
         """Whether the feature is supported or not."""
-        xml = self.as_xml()
-        return int(xml.get('supported'))
+        return int(self.get_attribute('supported'))
 
     def __str__(self):
         if self.is_supported():
-            xml = self.as_xml()
-            return xml.text
+            return self.get_text()
         else:
             return "* Feature not supported *"
 
@@ -176,6 +278,12 @@ class Api:
 
     conn = None
     transID = 0
+    pending = None
+    trans_id_regex = re.compile('transaction_id=["\']([0-9]+)["\']')
+
+    """ Commands after which properties may have changed """
+    continuation_cmds = ('run','step_into','step_over','step_out',\
+            'eval','property_set','feature_set','stop','detach')
 
     def __init__(self,connection):
         """Create a new Api using a Connection object.
@@ -191,13 +299,16 @@ class Api:
         self.idekey = None
         self.startfile = None
         self.conn = connection
+        self.demux = Demultiplexer(connection)
+        self.property_cache = PropertyCache()
+        self.features = {}
         if self.conn.isconnected() == 0:
             self.conn.open()
         self.__parse_init_msg(self.conn.recv_msg())
         
     def __parse_init_msg(self,msg):
         """Parse the init message from the debugger"""
-        xml = ET.fromstring(msg)
+        xml = ET.fromstring(buffer(msg))
         self.language = xml.get("language")
         if self.language is None:
             raise ResponseError(
@@ -222,19 +333,186 @@ class Api:
         args -- arguments for the command, which is optional 
                 for certain commands (default '')
         """
+        self.__check_not_busy()
         args = args.strip()
+        send = self.__build_cmd(cmd,args)
+        self.conn.send_msg(send)
+        msg = self.__recv_response()
+        return res_cls(msg,cmd,args,self)
+
+    def send_cmd_async(self,cmd,args = '',
+            res_cls = Response):
+        """Send a command to the debugger, without waiting for
+        the response.
+
+        The response is received on a background thread. Until
+        it has been collected with recv_pending(), no other
+        commands can be sent.
+
+        Returns a PendingResponse object.
+
+        The arguments are the same as for send_cmd().
+        """
+        self.__check_not_busy()
+        args = args.strip()
+        send = self.__build_cmd(cmd,args)
+        self.conn.send_msg(send)
+        self.pending = PendingResponse(self,self.transID,cmd,args,res_cls)
+        return self.pending
+
+    def is_busy(self):
+        """Whether a command sent with send_cmd_async() is still
+        waiting for its response to be collected."""
+        return self.pending is not None
+
+    def dispatch_packets(self):
+        """Pass any stream or notify packets that have been received
+        to their handlers."""
+        self.demux.dispatch()
+
+    def recv_pending(self):
+        """Collect the response to the command sent with
+        send_cmd_async(), waiting for it if necessary.
+
+        Returns a Response object.
+        """
+        if self.pending is None:
+            raise DBGPError("No command is waiting for a response",0)
+        pending = self.pending
+        self.pending = None
+        try:
+            msg = pending.wait()
+        finally:
+            self.demux.dispatch()
+        if vdebug.log.Log.is_enabled(vdebug.log.Logger.DEBUG):
+            vdebug.log.Log("Response: "+str(msg),\
+                    vdebug.log.Logger.DEBUG)
+        return pending.res_cls(msg,pending.cmd,pending.args,self)
+
+    def break_execution(self):
+        """Tell the debugger engine to break, while it's executing a
+        command sent with send_cmd_async().
+
+        The break command is written while the other command is still
+        waiting for its response. The engine then answers both, and
+        the response to the original command is collected as normal
+        with recv_pending().
+
+        Returns True if the break was sent, or False if the engine
+        had already responded.
+        """
+        if self.pending is None:
+            raise DBGPError("The debugger engine is not running",0)
+        send = self.__build_cmd('break','')
+        if not self.pending.expect(self.transID):
+            return False
+        self.conn.send_msg(send)
+        return True
+
+    def __check_not_busy(self):
+        if self.is_busy():
+            raise EngineBusyError("The debugger engine is running: "+\
+                    "wait for it to break, or stop it")
+
+    def send_cmds(self,cmds,return_errors = False):
+        """Send several commands to the debugger in one go.
+
+        All the commands are written at once, each with its own
+        transaction ID, and the responses are then read back and
+        matched to their commands by transaction ID. This saves a
+        network round trip per command.
+
+        Returns a list of Response objects, in the same order as
+        the commands. All of the responses are read before any error
+        is raised.
+
+        cmds -- a list of (cmd, args, res_cls) tuples, with the same
+                meaning as the arguments to send_cmd()
+        return_errors -- if True, the error for a command that fails
+                is put in the list in place of its response, rather
+                than being raised
+        """
+        if len(cmds) == 0:
+            return []
+        self.__check_not_busy()
+        pending = {}
+        order = []
+        sends = []
+        for (cmd, args, res_cls) in cmds:
+            args = args.strip()
+            sends.append(self.__build_cmd(cmd,args))
+            pending[self.transID] = (cmd,args,res_cls)
+            order.append(self.transID)
+        self.conn.send_msgs(sends)
+
+        received = {}
+        while len(received) < len(order):
+            msg = self.__recv_response()
+            trans_id = self.get_transaction_id(msg)
+            if trans_id not in pending or trans_id in received:
+                raise ResponseError(
+                    "Unexpected transaction ID in response",
+                    str(msg))
+            (cmd, args, res_cls) = pending[trans_id]
+            try:
+                received[trans_id] = res_cls(msg,cmd,args,self)
+            except (DBGPError, CmdNotImplementedError, ResponseError) as e:
+                received[trans_id] = e
+
+        responses = [received[trans_id] for trans_id in order]
+        if not return_errors:
+            for res in responses:
+                if isinstance(res,Exception):
+                    raise res
+        return responses
+
+    def __build_cmd(self,cmd,args):
+        """Build a command string, with a new transaction ID."""
         send = cmd.strip()
+        if self.__changes_properties(send,args):
+            self.property_cache.clear()
         self.transID += 1
         send += ' -i '+ str(self.transID)
         if len(args) > 0:
             send += ' ' + args
         vdebug.log.Log("Command: "+send,\
                 vdebug.log.Logger.DEBUG)
-        self.conn.send_msg(send)
-        msg = self.conn.recv_msg()
-        vdebug.log.Log("Response: "+msg,\
-                vdebug.log.Logger.DEBUG)
-        return res_cls(msg,cmd,args,self)
+        return send
+
+    def __changes_properties(self,cmd,args):
+        """Whether a command could change the properties returned by
+        property_get.
+
+        Setting max_depth only changes how much of each property is
+        sent, and the cache is keyed on it, so it's left out."""
+        if cmd == 'feature_set' and args.startswith('-n max_depth '):
+            return False
+        return cmd in self.continuation_cmds
+
+    def __recv_response(self):
+        """Receive the next command response from the debugger.
+
+        Any stream or notify packets received before it are passed
+        to their handlers."""
+        msg = self.demux.recv_response()
+        if vdebug.log.Log.is_enabled(vdebug.log.Logger.DEBUG):
+            vdebug.log.Log("Response: "+str(msg),\
+                    vdebug.log.Logger.DEBUG)
+        self.demux.dispatch()
+        return msg
+
+    def get_transaction_id(self,msg):
+        """Read the transaction ID from the root tag of a response,
+        without parsing the whole message."""
+        tag_start = msg.find('<response')
+        tag_end = msg.find('>',tag_start)
+        if tag_start != -1 and tag_end != -1:
+            match = self.trans_id_regex.search(str(msg[tag_start:tag_end]))
+            if match is not None:
+                return int(match.group(1))
+        raise ResponseError(
+            "Missing transaction ID in response",
+            str(msg))
 
     def status(self):
         """Get the debugger status.
@@ -267,9 +545,25 @@ class Api:
         name -- name of the feature, e.g. encoding
         value -- new value for the feature
         """
-        return self.send_cmd(
+        res = self.send_cmd(
                 'feature_set',
                 '-n ' + str(name) + ' -v ' + str(value))
+        self.features[str(name)] = str(value)
+        return res
+
+    def feature_value(self,name):
+        """Get the value of a feature, asking the debugger the first
+        time and then remembering it.
+
+        Returns None if the feature isn't supported.
+        """
+        if name not in self.features:
+            res = self.feature_get(name)
+            if res.is_supported():
+                self.features[name] = str(res)
+            else:
+                self.features[name] = None
+        return self.features[name]
 
     def run(self):
         """Tell the debugger to start or resume
@@ -324,6 +618,17 @@ class Api:
         """
         return self.send_cmd('stack_get','',StackGetResponse)
 
+    def stack_and_context_get(self,context = 0):
+        """Get the stack information and context variables together.
+
+        Both commands are sent at once, to save a round trip.
+
+        Returns a tuple of (StackGetResponse, ContextGetResponse).
+        """
+        return tuple(self.send_cmds([\
+                ('stack_get','',StackGetResponse),\
+                ('context_get','-c %i' % int(context),ContextGetResponse)]))
+
     def context_get(self,context = 0):
         """Get the context variables.
         """
@@ -336,10 +641,61 @@ class Api:
         """
         return self.send_cmd('context_names','',ContextNamesResponse)
 
-    def property_get(self,name):
+    def property_get(self,name,page = 0,context_id = 0,stack_depth = 0):
         """Get a property.
+
+        The response is cached until the debugger engine next
+        executes code, so getting the same property again doesn't go
+        back to the engine.
+
+        name -- the full name of the property
+        page -- the page of child properties to get, if the property
+                has more children than the max_children feature
+        context_id -- the context that the property is in
+        stack_depth -- the stack frame that the property is in
         """
-        return self.send_cmd('property_get','-n %s -d 0' % name,ContextGetResponse)
+        key = (stack_depth,context_id,name,page)
+        res = self.property_cache.get(key)
+        if res is None:
+            args = self.__property_args(name,page,context_id,stack_depth)
+            res = self.send_cmd('property_get',args,ContextGetResponse)
+            self.property_cache.add(key,res)
+        return res
+
+    def property_get_tree(self,name,max_depth,context_id = 0,\
+            stack_depth = 0):
+        """Get a property along with its descendants, down to
+        max_depth levels.
+
+        The max_depth feature is raised for the one property_get
+        command and then set back, with the three commands sent
+        together. The response is cached in the same way as
+        property_get().
+        """
+        key = (stack_depth,context_id,name,0,max_depth)
+        res = self.property_cache.get(key)
+        if res is None:
+            default_depth = self.feature_value('max_depth')
+            args = self.__property_args(name,0,context_id,stack_depth)
+            if default_depth is None:
+                res = self.send_cmd('property_get',args,ContextGetResponse)
+            else:
+                res = self.send_cmds([\
+                    ('feature_set','-n max_depth -v %i' % max_depth,\
+                            Response),\
+                    ('property_get',args,ContextGetResponse),\
+                    ('feature_set','-n max_depth -v %s' % default_depth,\
+                            Response)])[1]
+            self.property_cache.add(key,res)
+        return res
+
+    def __property_args(self,name,page,context_id,stack_depth):
+        args = '-n %s -d %i' % (name,stack_depth)
+        if context_id > 0:
+            args += ' -c %i' % context_id
+        if page > 0:
+            args += ' -p %i' % page
+        return args
 
     def detach(self):
         """Tell the debugger to detach itself from this
@@ -359,6 +715,28 @@ class Api:
         return self.send_cmd('breakpoint_set',cmd_args,\
                 BreakpointSetResponse)
 
+    def breakpoint_set_batch(self,cmd_args_list):
+        """Set several breakpoints at once.
+
+        Returns a list with a BreakpointSetResponse object for each
+        item of cmd_args_list, or the error (e.g. a DBGPError) if that
+        breakpoint couldn't be set."""
+        return self.send_cmds([('breakpoint_set',cmd_args,\
+                BreakpointSetResponse) for cmd_args in cmd_args_list],\
+                True)
+
+    def stdout(self,mode):
+        """Set whether the program's stdout is sent to the client.
+
+        mode -- 0 to disable, 1 to copy or 2 to redirect"""
+        return self.send_cmd('stdout','-c %i' % int(mode))
+
+    def stderr(self,mode):
+        """Set whether the program's stderr is sent to the client.
+
+        mode -- 0 to disable, 1 to copy or 2 to redirect"""
+        return self.send_cmd('stderr','-c %i' % int(mode))
+
     def breakpoint_list(self):
         return self.send_cmd('breakpoint_list')
 
@@ -368,6 +746,186 @@ class Api:
         The ID is that returned in the response from breakpoint_set."""
         return self.send_cmd('breakpoint_remove','-d %i' % id,Response)
 
+class PropertyCache:
+    """Responses to property_get commands, kept until the debugger
+    engine executes any more code.
+
+    The numbers of hits and misses are counted for the whole session.
+    """
+
+    def __init__(self):
+        self.responses = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self,key):
+        """Get a cached response, or None."""
+        res = self.responses.get(key)
+        if res is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return res
+
+    def add(self,key,response):
+        self.responses[key] = response
+
+    def clear(self):
+        if self.responses:
+            vdebug.log.Log("Clearing %i cached properties (%i hits, "\
+                    "%i misses)" %(len(self.responses),self.hits,\
+                    self.misses),vdebug.log.Logger.DEBUG)
+            self.responses = {}
+
+class PendingResponse:
+    """The response to a command sent with Api.send_cmd_async().
+
+    The message is received on a background thread, so that the
+    caller can carry on while the debugger engine executes. Only
+    the socket is touched from the background thread.
+    """
+
+    def __init__(self,api,trans_id,cmd,args,res_cls):
+        self.trans_id = trans_id
+        self.cmd = cmd
+        self.args = args
+        self.res_cls = res_cls
+        self.msgs = {}
+        self.expected = set([trans_id])
+        self.error = None
+        self.demux = api.demux
+        self.get_transaction_id = api.get_transaction_id
+        self.lock = threading.Lock()
+        self.received = threading.Event()
+        self.thread = threading.Thread(target=self.__receive)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __receive(self):
+        try:
+            while True:
+                msg = self.demux.recv_response()
+                trans_id = self.get_transaction_id(msg)
+                with self.lock:
+                    self.msgs[trans_id] = msg
+                    if self.expected.issubset(self.msgs):
+                        break
+        except Exception as e:
+            self.error = e
+        self.received.set()
+
+    def expect(self,trans_id):
+        """Also wait for the response to another command, such as
+        break, before becoming ready.
+
+        Returns False if receiving has already finished."""
+        with self.lock:
+            if self.received.is_set() or \
+                    self.expected.issubset(self.msgs):
+                return False
+            self.expected.add(trans_id)
+            return True
+
+    def is_ready(self):
+        """Whether the message has been received, or receiving
+        it has failed."""
+        return self.received.is_set()
+
+    def wait(self):
+        """Wait for the message and return it.
+
+        Any error raised while receiving is raised here instead."""
+        self.received.wait()
+        if self.error is not None:
+            raise self.error
+        return self.msgs[self.trans_id]
+
+class Demultiplexer:
+    """Separates command responses from other packets sent by the
+    debugger engine.
+
+    Besides responses to commands, an engine can send stream packets
+    (e.g. redirected stdout) and notify packets (e.g. when a breakpoint
+    is resolved) at any time. These are queued as they are received,
+    and passed to the handlers registered for their packet type when
+    dispatch() is called. Receiving may happen on a background thread,
+    but dispatching should be done on the main thread.
+    """
+
+    (RESPONSE,STREAM,NOTIFY) = ('response','stream','notify')
+    tag_regex = re.compile('<([a-zA-Z_][a-zA-Z0-9_.:-]*)')
+
+    def __init__(self,connection):
+        self.conn = connection
+        self.queue = collections.deque()
+        self.handlers = {self.STREAM : [], self.NOTIFY : []}
+
+    def add_handler(self,packet_type,handler):
+        """Register a handler for stream or notify packets.
+
+        The handler is called with a Stream or Notification object.
+
+        packet_type -- Demultiplexer.STREAM or Demultiplexer.NOTIFY
+        handler -- a callable taking a single argument
+        """
+        self.handlers[packet_type].append(handler)
+
+    def get_packet_type(self,msg):
+        """Get the packet type of a message from its root tag name."""
+        pos = msg.find('<')
+        while pos != -1 and msg[pos+1:pos+2] in ('?','!'):
+            pos = msg.find('<',pos+1)
+        if pos == -1:
+            raise ResponseError("Invalid packet from debugger",str(msg))
+        match = self.tag_regex.match(str(msg[pos:pos+64]))
+        if match is None:
+            raise ResponseError("Invalid packet from debugger",str(msg))
+        return match.group(1).split(':')[-1]
+
+    def recv_response(self):
+        """Receive messages until a command response is found, and
+        return it. Stream and notify packets are queued."""
+        while True:
+            msg = self.conn.recv_msg()
+            packet_type = self.get_packet_type(msg)
+            if packet_type in self.handlers:
+                self.queue.append((packet_type,msg))
+            else:
+                return msg
+
+    def dispatch(self):
+        """Pass queued stream and notify packets to their handlers."""
+        while self.queue:
+            (packet_type, msg) = self.queue.popleft()
+            if packet_type == self.STREAM:
+                packet = Stream(msg)
+            else:
+                packet = Notification(msg)
+            for handler in self.handlers[packet_type]:
+                handler(packet)
+
+class Stream:
+    """A stream packet, containing output from the program being
+    debugged."""
+
+    def __init__(self,msg):
+        xml = ET.fromstring(buffer(msg))
+        self.type = xml.get('type')
+        text = xml.text
+        if text is None:
+            text = ""
+        elif xml.get('encoding') == 'base64':
+            text = base64.decodestring(text)
+        self.text = text
+
+class Notification:
+    """A notify packet, sent by the debugger engine to tell the client
+    about an event."""
+
+    def __init__(self,msg):
+        self.xml = ET.fromstring(buffer(msg))
+        self.name = self.xml.get('name')
+
 """Connection module for managing a socket connection
 between this client and the debugger."""
 
@@ -380,8 +938,11 @@ class Connection:
     sock = None
     address = None
     isconned = 0
+    recv_size = 8192
+    poll_interval = 0.1
 
-    def __init__(self, host = '', port = 9000, timeout = 30, input_stream = None):
+    def __init__(self, host = '', port = 9000, timeout = 30, input_stream = None,
+            listener = None):
         """Create a new Connection.
 
         The connection is not established until open() is called.
@@ -390,11 +951,14 @@ class Connection:
         port -- port number which debugger is listening on (default 9000)
         timeout -- time in seconds to wait for a debugger connection before giving up (default 30)
         input_stream -- object for checking input stream and user interrupts (default None)
+        listener -- a Listener whose server socket is shared between connections (default None)
         """
         self.port = port
         self.host = host
         self.timeout = timeout
         self.input_stream = input_stream
+        self.listener = listener
+        self.buffer = bytearray()
 
     def __del__(self):
         """Make sure the connection is closed."""
@@ -406,97 +970,130 @@ class Connection:
 
     def open(self):
         """Listen for a connection from the debugger. Listening for the actual
-        connection is handled by self.listen()."""
+        connection is handled by self.listen().
+
+        If the connection was given a Listener, its server socket is used
+        and left open afterwards. Otherwise a temporary one is created and
+        closed once a connection has been made."""
         print 'Waiting for a connection (Ctrl-C to cancel, this message will self-destruct in ',self.timeout,' seconds...)'
-        serv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.listener is None:
+            listener = Listener(self.host, self.port)
+        else:
+            listener = self.listener
         try:
-            serv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            serv.setblocking(0)
-            serv.bind((self.host, self.port))
-            serv.listen(5)
+            serv = listener.start()
             (self.sock, self.address) = self.listen(serv, self.timeout)
             self.sock.settimeout(None)
         except socket.timeout:
-            serv.close()
             raise TimeoutError("Timeout waiting for connection")
-        except:
-            serv.close()
-            raise
+        finally:
+            if listener is not self.listener:
+                listener.stop()
 
         self.isconned = 1
-        serv.close()
     
     def listen(self, serv, timeout):
         """Non-blocking listener. Provides support for keyboard interrupts from
         the user. Although it's non-blocking, the user interface will still 
         block until the timeout is reached.
+
+        The server socket is waited on with select() in slices of
+        poll_interval seconds, so that user interrupts can be checked
+        between slices without spinning the CPU.
         
         serv -- Socket server to listen to.
         timeout -- Seconds before timeout.
         """
         start = time.time()
         while True:
-            if (time.time() - start) > timeout:
+            remaining = timeout - (time.time() - start)
+            if remaining <= 0:
                 raise socket.timeout
-            try:
-                """Check for user interrupts"""
-                if self.input_stream is not None:
-                    self.input_stream.probe()
-                return serv.accept()
-            except socket.error:
-                pass
+            """Check for user interrupts"""
+            if self.input_stream is not None:
+                self.input_stream.probe()
+            readable = select.select([serv],[],[],\
+                    min(self.poll_interval,remaining))[0]
+            if readable:
+                try:
+                    return serv.accept()
+                except socket.error:
+                    pass
 
     def close(self):
         """Close the connection."""
         if self.sock != None:
             vdebug.log.Log("Closing the socket",\
                             vdebug.log.Logger.DEBUG)
+            try:
+                """Wake up any thread still receiving on the socket"""
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
             self.sock.close()
             self.sock = None
+        del self.buffer[:]
         self.isconned = 0
 
+    def __fill_buffer(self):
+        """Read the next chunk from the socket into the frame buffer."""
+        buf = self.sock.recv(self.recv_size)
+        if buf == '':
+            self.close()
+            raise EOFError('Socket Closed')
+        self.buffer.extend(buf)
+
     def __recv_length(self):
         """Get the length of the proceeding message."""
-        length = ''
         while 1:
-            c = self.sock.recv(1)
-            if c == '':
-                self.close()
-                raise EOFError('Socket Closed')
-            if c == '\0':
-                return int(length)
-            if c.isdigit():
-                length = length + c
+            null_pos = self.buffer.find('\0')
+            if null_pos != -1:
+                break
+            self.__fill_buffer()
+        length = ''.join(c for c in str(self.buffer[:null_pos]) \
+                if c.isdigit())
+        del self.buffer[:null_pos+1]
+        return int(length)
 
     def __recv_null(self):
         """Receive a null byte."""
         while 1:
-            c = self.sock.recv(1)
-            if c == '':
-                self.close()
-                raise EOFError('Socket Closed')
-            if c == '\0':
+            null_pos = self.buffer.find('\0')
+            if null_pos != -1:
+                del self.buffer[:null_pos+1]
                 return
+            del self.buffer[:]
+            self.__fill_buffer()
 
     def __recv_body(self, to_recv):
         """Receive a message of a given length.
 
+        The body is read straight into a bytearray of exactly to_recv
+        bytes, so the payload is only held in memory once.
+
         to_recv -- length of the message to receive
         """
-        body = ''
-        while to_recv > 0:
-            buf = self.sock.recv(to_recv)
-            if buf == '':
+        body = bytearray(to_recv)
+        filled = min(len(self.buffer), to_recv)
+        body[:filled] = self.buffer[:filled]
+        del self.buffer[:filled]
+        view = memoryview(body)
+        while filled < to_recv:
+            received = self.sock.recv_into(view[filled:], to_recv - filled)
+            if received == 0:
                 self.close()
                 raise EOFError('Socket Closed')
-            to_recv -= len(buf)
-            body = body + buf
+            filled += received
         return body
 
     def recv_msg(self):
         """Receive a message from the debugger.
         
-        Returns a string, which is expected to be XML.
+        Returns a bytearray, which is expected to be XML.
+
+        The socket is read in chunks of recv_size bytes, and any bytes
+        belonging to the following message are kept in the buffer for
+        the next call.
         """
         length = self.__recv_length()
         body     = self.__recv_body(length)
@@ -510,49 +1107,494 @@ class Connection:
         """
         self.sock.send(cmd + '\0')
 
-class ContextProperty:
+    def send_msgs(self, cmds):
+        """Send several messages to the debugger in a single write.
 
-    ns = '{urn:debugger_protocol_v1}'
+        cmds -- list of commands to send
+        """
+        self.sock.sendall(''.join([cmd + '\0' for cmd in cmds]))
 
-    def __init__(self,node,parent = None,depth = 0):
-        self.parent = parent
-        self.__determine_type(node)
-        self._determine_displayname(node)
-        self.encoding = node.get('encoding')
-        self.depth = depth
-        
-        self.size = node.get('size')
-        self.value = ""
-        self.is_last_child = False
+class Listener:
+    """Server socket that debugger engines connect to.
+
+    The socket stays bound until stop() is called, so a Listener that is
+    kept between debugging sessions queues incoming connections in its
+    backlog, ready for the next Connection to accept.
+    """
+
+    backlog = 5
+
+    def __init__(self, host = '', port = 9000):
+        """Create a new Listener.
+
+        The socket is not bound until start() is called.
+
+        host -- host name to listen on (default '')
+        port -- port number to listen on (default 9000)
+        """
+        self.host = host
+        self.port = port
+        self.serv = None
+
+    def __del__(self):
+        """Make sure the server socket is closed."""
+        self.stop()
 
-        self._determine_children(node)
+    def is_listening(self):
+        """Whether the server socket is bound and listening."""
+        return self.serv is not None
+
+    def listens_on(self, host, port):
+        """Whether this listener is for the given host and port."""
+        return self.host == host and self.port == port
+
+    def start(self):
+        """Bind and listen on the server socket, if not already doing so.
+
+        Returns the server socket."""
+        if self.serv is None:
+            serv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                serv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                serv.setblocking(0)
+                serv.bind((self.host, self.port))
+                serv.listen(self.backlog)
+            except:
+                serv.close()
+                raise
+            vdebug.log.Log("Listening on %s:%s" %(self.host,self.port),\
+                            vdebug.log.Logger.DEBUG)
+            self.serv = serv
+        return self.serv
+
+    def stop(self):
+        """Close the server socket."""
+        if self.serv is not None:
+            vdebug.log.Log("Closing the server socket",\
+                            vdebug.log.Logger.DEBUG)
+            self.serv.close()
+            self.serv = None
+
+class ContextPropertyParser:
+    """Incremental parser for the properties in a context_get,
+    property_get or eval response.
+
+    The response is fed to expat in chunks, and properties are
+    yielded as soon as they have been parsed. Each property node is
+    built without its child properties, so the full tree is never
+    held in memory. A property is created when its first child
+    property starts (or when it ends, if it has none), so that it
+    always comes before its children.
+
+    Some engines send a property's name after its children. Such a
+    property can't be created before its children, so its subtree is
+    built in full and the properties are created when it ends.
+    """
+
+    chunk_size = 65536
+
+    def __init__(self,response):
+        self.response = response
+        self.table = response.create_table()
+        self.stack = []
+        self.nodes = []
+        self.texts = []
+        self.deferred = None
+        self.parsed = []
+
+    def parse(self):
+        """Generator yielding properties as they are parsed."""
+        parser = xml.parsers.expat.ParserCreate(namespace_separator='}')
+        parser.returns_unicode = False
+        parser.StartElementHandler = self.__start
+        parser.EndElementHandler = self.__end
+        parser.CharacterDataHandler = self.__data
+
+        msg = self.response.response
+        length = len(msg)
+        offset = 0
+        while offset < length:
+            parser.Parse(buffer(msg,offset,self.chunk_size),False)
+            offset += self.chunk_size
+            for p in self.__take_parsed():
+                yield p
+        parser.Parse('',True)
+        for p in self.__take_parsed():
+            yield p
+        self.response.table = self.table
+
+    def __take_parsed(self):
+        parsed = self.parsed
+        self.parsed = []
+        return parsed
+
+    def __is_property(self,tag):
+        return tag == 'property' or tag.endswith('}property')
+
+    def __is_named(self,node):
+        """Whether the node's name is known yet."""
+        if node.get('fullname') is not None or \
+                node.get('name') is not None:
+            return True
+        for child in node:
+            if child.tag.endswith('name'):
+                return True
+        return False
+
+    def __start(self,name,attrs):
+        if '}' in name:
+            name = '{' + name
+        node = ET.Element(name,attrs)
+        parent_node = None
+        if self.nodes:
+            parent_node = self.nodes[-1]
+
+        if self.deferred is not None:
+            parent_node.append(node)
+        elif self.__is_property(name):
+            if self.stack:
+                frame = self.stack[-1]
+                if frame['property'] is None and \
+                        not self.__is_named(frame['node']):
+                    self.deferred = frame
+                    parent_node.append(node)
+                else:
+                    if frame['property'] is None:
+                        self.__create(frame)
+                    frame['property'].num_loaded_children += 1
+            if self.deferred is None:
+                self.stack.append({'node':node,'property':None,\
+                        'depth':len(self.stack)})
+        elif parent_node is not None:
+            parent_node.append(node)
+        else:
+            """ Not inside a property """
+            node = None
+
+        self.nodes.append(node)
+        self.texts.append([])
+
+    def __data(self,data):
+        if self.texts:
+            self.texts[-1].append(data)
+
+    def __end(self,name):
+        node = self.nodes.pop()
+        text = ''.join(self.texts.pop())
+        if node is None:
+            return
+        if len(text) > 0:
+            node.text = text
+
+        if self.deferred is not None:
+            if node is self.deferred['node']:
+                self.deferred = None
+                self.__create(self.stack.pop())
+        elif self.__is_property(node.tag):
+            frame = self.stack.pop()
+            if frame['property'] is None:
+                self.__create(frame)
+
+    def __create(self,frame):
+        """Create the property for a stack frame, along with any child
+        properties that have been added to its node."""
+        depth = frame['depth']
+        if depth > 0:
+            parent = self.stack[depth-1]['property']
+        else:
+            parent = None
+        first_row = len(self.table)
+        prop = self.response.create_property(frame['node'],parent,depth,\
+                self.table)
+        if parent is not None and \
+                parent.num_loaded_children == parent.num_declared_children:
+            prop.mark_as_last_child()
+        frame['property'] = prop
+        self.parsed.append(prop)
+        for row in range(first_row+1,len(self.table)):
+            self.parsed.append(self.table.view(row))
+
+class PropertyTable:
+    """Compact storage for the properties in a response.
+
+    Each property is a row, stored as a position in a set of parallel
+    columns. Numeric columns are arrays, and the string columns are
+    lists sharing the strings that were parsed from the response.
+    Rows are added in depth-first order, so a property's children are
+    always in the rows that follow it.
+
+    Property objects are created on demand as views on to a row.
+
+    Values are stored as they appear in the response, and are only
+    decoded and quoted when they are first read.
+    """
+    LAST_CHILD = 1
+    BASE64 = 2
+    VALUE_BASE64 = 4
+    VALUE_QUOTED = 8
+
+    def __init__(self,property_class,code = None,language = None):
+        self.property_class = property_class
+        self.code = code
+        if language is not None:
+            language = language.lower()
+        self.language = language
+        self.depths = array.array('i')
+        self.parents = array.array('i')
+        self.num_declared = array.array('i')
+        self.num_loaded = array.array('i')
+        self.sizes = array.array('i')
+        self.pages = array.array('i')
+        self.page_sizes = array.array('i')
+        self.flags = array.array('B')
+        self.types = []
+        self.names = []
+        self.values = []
+
+    def __len__(self):
+        return len(self.depths)
+
+    def add(self,depth,parent,type,size,num_children,page = 0,\
+            page_size = 0):
+        """Add a row, returning its index. The name and value are
+        set afterwards."""
+        self.depths.append(depth)
+        self.parents.append(parent)
+        self.num_declared.append(num_children)
+        self.num_loaded.append(0)
+        if size is None:
+            self.sizes.append(-1)
+        else:
+            self.sizes.append(int(size))
+        self.pages.append(page)
+        self.page_sizes.append(page_size)
+        self.flags.append(0)
+        if isinstance(type,str):
+            type = intern(type)
+        self.types.append(type)
+        self.names.append("")
+        self.values.append("")
+        return len(self.depths) - 1
+
+    def view(self,index):
+        """Get a property object for a row."""
+        return self.property_class.view(self,index)
+
+    def properties(self):
+        """Get property objects for all rows, in order."""
+        return [self.view(i) for i in range(len(self))]
+
+    def children(self,index):
+        """Get the row indexes of the children of a row."""
+        depth = self.depths[index]
+        children = []
+        for i in range(index+1,len(self)):
+            if self.depths[i] <= depth:
+                break
+            if self.parents[i] == index:
+                children.append(i)
+        return children
+
+    def memory_usage(self):
+        """Approximate number of bytes used by the table, not
+        counting the strings it shares with the parser."""
+        columns = (self.depths,self.parents,self.num_declared,\
+                self.num_loaded,self.sizes,self.pages,self.page_sizes,\
+                self.flags,self.types,\
+                self.names,self.values)
+        return sum(sys.getsizeof(c) for c in columns)
+
+class ContextProperty(object):
+    """A property in a context, as a view on to a row of a
+    PropertyTable.
+
+    Properties only hold their table and row number (__slots__ needs a
+    new style class), so any number of them can be created from the
+    same table without copying its data.
+    """
+
+    __slots__ = ('table','index')
+    ns = '{urn:debugger_protocol_v1}'
+
+    def __init__(self,node,parent = None,depth = 0,table = None):
+        if table is None:
+            if parent is None:
+                table = self._create_table()
+            else:
+                table = parent.table
+        if parent is None:
+            parent_index = -1
+        else:
+            parent_index = parent.index
+        self.table = table
+        self.index = table.add(depth,parent_index,\
+                self.__determine_type(node),node.get('size'),\
+                self._determine_children(node),\
+                int(node.get('page',0)),int(node.get('pagesize',0)))
+        table.names[self.index] = self._determine_displayname(node)
+        if node.get('encoding') == 'base64':
+            table.flags[self.index] |= PropertyTable.BASE64
         self.__determine_value(node)
         self.__init_children(node)
         if self.type == 'scalar':
-            self.size = len(self.value) - 2
+            table.sizes[self.index] = self.__get_value_length()
+
+    @classmethod
+    def view(cls,table,index):
+        """Create a property for an existing row in a table."""
+        prop = cls.__new__(cls)
+        prop.table = table
+        prop.index = index
+        return prop
+
+    def _create_table(self):
+        return PropertyTable(ContextProperty)
+
+    def __eq__(self,other):
+        return isinstance(other,ContextProperty) and \
+                self.table is other.table and self.index == other.index
+
+    def __ne__(self,other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self.table),self.index))
+
+    @property
+    def parent(self):
+        parent = self.table.parents[self.index]
+        if parent < 0:
+            return None
+        return self.table.view(parent)
+
+    @property
+    def children(self):
+        return [self.table.view(i) for i in self.table.children(self.index)]
+
+    @property
+    def depth(self):
+        return self.table.depths[self.index]
+
+    @property
+    def type(self):
+        return self.table.types[self.index]
+
+    @property
+    def size(self):
+        size = self.table.sizes[self.index]
+        if size < 0:
+            return None
+        return str(size)
+
+    @property
+    def display_name(self):
+        return self.table.names[self.index]
+
+    @property
+    def value(self):
+        table = self.table
+        pending = table.flags[self.index] & \
+                (PropertyTable.VALUE_BASE64 | PropertyTable.VALUE_QUOTED)
+        if pending:
+            value = table.values[self.index]
+            if pending & PropertyTable.VALUE_BASE64:
+                value = base64.decodestring(value)
+            if pending & PropertyTable.VALUE_QUOTED:
+                value = '`%s`' % value.replace('`','\\`')
+            table.values[self.index] = value
+            table.flags[self.index] &= ~pending
+        return table.values[self.index]
+
+    @property
+    def encoding(self):
+        if self.table.flags[self.index] & PropertyTable.BASE64:
+            return 'base64'
+        return None
+
+    @property
+    def num_crs(self):
+        return self.value.count('\n')
+
+    @property
+    def num_declared_children(self):
+        return self.table.num_declared[self.index]
+
+    @property
+    def has_children(self):
+        return self.num_declared_children > 0
+
+    @property
+    def page(self):
+        """The page of children that was retrieved, starting at 0."""
+        return self.table.pages[self.index]
+
+    @property
+    def page_size(self):
+        return self.table.page_sizes[self.index]
+
+    @property
+    def num_pages(self):
+        """The number of pages needed to retrieve all children."""
+        if self.page_size <= 0:
+            return 1
+        return (self.num_declared_children + self.page_size - 1) / \
+                self.page_size
+
+    def has_more_pages(self):
+        """Whether there are children on pages after this one."""
+        return self.page + 1 < self.num_pages
+
+    @property
+    def is_last_child(self):
+        return bool(self.table.flags[self.index] & PropertyTable.LAST_CHILD)
+
+    def _get_num_loaded_children(self):
+        return self.table.num_loaded[self.index]
+
+    def _set_num_loaded_children(self,num):
+        self.table.num_loaded[self.index] = num
+
+    num_loaded_children = property(_get_num_loaded_children,\
+            _set_num_loaded_children)
 
     def __determine_value(self,node):
+        """Store the undecoded value, flagging how it needs to be
+        decoded when it's read."""
         if self.has_children:
-            self.value = ""
             return
 
-        self.value = self._get_enc_node_text(node,'value')
-        if self.value is None:
-            if self.encoding == 'base64':
-                if node.text is None:
-                    self.value = ""
-                else:
-                    self.value = base64.decodestring(node.text)
-            elif not self.is_uninitialized() \
-                    and not self.has_children:
-                self.value = node.text
+        flags = 0
+        value = None
+        n = node.find('%svalue' % self.ns)
+        if n is not None and n.text is not None:
+            value = n.text
+            if n.get('encoding') == 'base64':
+                flags |= PropertyTable.VALUE_BASE64
+        elif self.encoding == 'base64':
+            value = node.text
+            flags |= PropertyTable.VALUE_BASE64
+        elif not self.is_uninitialized():
+            value = node.text
 
-        if self.value is None:
-            self.value = ""
+        if value is None:
+            value = ""
+            flags = 0
 
-        self.num_crs = self.value.count('\n')
         if self.type.lower() in ("string","str","scalar"):
-            self.value = '`%s`' % self.value.replace('`','\\`')
+            flags |= PropertyTable.VALUE_QUOTED
+        self.table.values[self.index] = value
+        self.table.flags[self.index] |= flags
+
+    def __get_value_length(self):
+        """Length of the decoded value, without decoding it."""
+        value = self.table.values[self.index]
+        if self.table.flags[self.index] & PropertyTable.VALUE_BASE64:
+            encoded = ''.join(value.split())
+            return len(encoded) * 3 / 4 - \
+                    (len(encoded) - len(encoded.rstrip('=')))
+        elif self.table.flags[self.index] & PropertyTable.VALUE_QUOTED:
+            return len(value)
+        return len(value) - 2
 
     def __determine_type(self,node):
         type = node.get('classname')
@@ -560,7 +1602,7 @@ class ContextProperty:
             type = node.get('type')
         if type is None:
             type = 'unknown'
-        self.type = type
+        return type
 
     def _determine_displayname(self,node):
         display_name = node.get('fullname')
@@ -568,7 +1610,7 @@ class ContextProperty:
             display_name = self._get_enc_node_text(node,'fullname',"")
         if display_name == '::':
             display_name = self.type
-        self.display_name = display_name
+        return display_name
 
     def _get_enc_node_text(self,node,name,default =
             None):
@@ -593,9 +1635,7 @@ class ContextProperty:
             children = 0
         else:
             children = int(children)
-        self.num_declared_children = children
-        self.has_children = True if children > 0 else False
-        self.children = []
+        return children
 
     def __init_children(self,node):
         if self.has_children:
@@ -607,15 +1647,15 @@ class ContextProperty:
                     if c.tag == tagname:
                         idx += 1
                         p = self._create_child(c,self,self.depth+1)
-                        self.children.append(p)
                         if idx == self.num_declared_children:
                             p.mark_as_last_child()
+                self.num_loaded_children = idx
 
     def _create_child(self,node,parent,depth):
-        return ContextProperty(node,parent,depth)
+        return ContextProperty(node,parent,depth,self.table)
 
     def mark_as_last_child(self):
-        self.is_last_child = True
+        self.table.flags[self.index] |= PropertyTable.LAST_CHILD
 
     def is_uninitialized(self):
         if self.type == 'uninitialized':
@@ -624,13 +1664,14 @@ class ContextProperty:
             return False
 
     def child_count(self):
-        return len(self.children)
+        """The number of children that have been retrieved."""
+        return self.num_loaded_children
 
     def type_and_size(self):
         size = None
         if self.has_children:
             size = self.num_declared_children
-        elif self.size is not None:
+        else:
             size = self.size
 
         if size is None:
@@ -639,40 +1680,50 @@ class ContextProperty:
             return "%s [%s]" %(self.type,size)
 
 class EvalProperty(ContextProperty):
-    def __init__(self,node,code,language,parent=None,depth=0):
-        self.code = code
-        self.language = language.lower()
-        if parent is None:
-            self.is_parent = True
-        else:
-            self.is_parent = False
-        ContextProperty.__init__(self,node,parent,depth)
+    __slots__ = ()
+
+    def __init__(self,node,code,language,parent=None,depth=0,table=None):
+        if table is None and parent is None:
+            table = PropertyTable(EvalProperty,code,language)
+        ContextProperty.__init__(self,node,parent,depth,table)
+
+    @property
+    def code(self):
+        return self.table.code
+
+    @property
+    def language(self):
+        return self.table.language
+
+    @property
+    def is_parent(self):
+        return self.table.parents[self.index] < 0
 
     def _create_child(self,node,parent,depth):
-        return EvalProperty(node,self.code,self.language,parent,depth)
+        return EvalProperty(node,self.code,self.language,parent,depth,\
+                self.table)
 
     def _determine_displayname(self,node):
         if self.is_parent:
-            self.display_name = self.code
+            return self.code
         else:
+            parent = self.parent
             if self.language == 'php' or \
                     self.language == 'perl':
-                if self.parent.type == 'array':
-                    self.display_name = self.parent.display_name + \
+                if parent.type == 'array':
+                    return parent.display_name + \
                         "['%s']" % node.get('name')
                 else:
-                    self.display_name = self.parent.display_name + \
+                    return parent.display_name + \
                         "->"+node.get('name')
             else:
                 name = node.get('name')
                 if name is None:
-                    name = "?"
                     name = self._get_enc_node_text(node,'name','?')
-                if self.parent.type == 'list':
-                    self.display_name = self.parent.display_name + name
+                if parent.type == 'list':
+                    return parent.display_name + name
                 else:
-                    self.display_name = self.parent.display_name + \
-                        "." + name
+                    return parent.display_name + "." + name
 
 
 """ Errors/Exceptions """
@@ -683,6 +1734,11 @@ class DBGPError(Exception):
     """Raised when the debugger returns an error message."""
     pass
 
+class EngineBusyError(Exception):
+    """Raised when sending a command while the debugger engine is
+    still executing a previous one."""
+    pass
+
 class CmdNotImplementedError(Exception):
     """Raised when the debugger returns an error message."""
     pass
@@ -28,25 +28,49 @@ class Dispatcher:
                         vdebug.log.Logger.DEBUG)
                 return False
 
-    def _get_event_by_position(self):
+    def expand_tree(self,depth):
+        if self.runner.is_alive():
+            if self._get_window_name() != self.runner.ui.watchwin.name:
+                self.runner.ui.error("Expanding only works in the watch window")
+                return False
+            event = WatchWindowExpandTreeEvent(depth)
+            return event.execute(self.runner)
+
+    def search_watch(self,pattern):
+        if self._get_window_name() != self.runner.ui.watchwin.name:
+            self.runner.ui.error("Searching only works in the watch window")
+            return False
+        event = WatchWindowSearchEvent(pattern)
+        return event.execute(self.runner)
+
+    def _get_window_name(self):
         buf_name = vim.current.buffer.name
         p = re.compile('.*[\\\/]([^\\\/]+)')
         m = p.match(buf_name)
         if m is None:
             return None
+        return m.group(1)
+
+    def _get_event_by_position(self):
+        window_name = self._get_window_name()
+        if window_name is None:
+            return None
 
-        window_name = m.group(1)
         if window_name == self.runner.ui.watchwin.name:
             lineno = vim.current.window.cursor[0]
             vdebug.log.Log("User action in watch window, line %s" % lineno,\
                     vdebug.log.Logger.DEBUG)
-            line = self.runner.ui.watchwin.buffer[lineno-1].strip()
-            if lineno == 1:
+            node = self.runner.ui.watchwin.get_node(lineno)
+            if self.runner.ui.watchwin.get_line_index(lineno) == 0:
                 return WatchWindowContextChangeEvent()
-            elif line.startswith(vdebug.opts.Options.get('marker_closed_tree')):
-                return WatchWindowPropertyGetEvent()
-            elif line.startswith(vdebug.opts.Options.get('marker_open_tree')):
+            elif node is None:
+                return None
+            elif node.is_load_more():
+                return WatchWindowLoadMoreEvent()
+            elif node.has_children and node.is_open:
                 return WatchWindowHideEvent()
+            elif node.has_children:
+                return WatchWindowPropertyGetEvent()
         elif window_name == self.runner.ui.stackwin.name:
             return StackWindowLineSelectEvent()
 
@@ -153,46 +177,102 @@ class WatchWindowPropertyGetEvent(Event):
     """
     def execute(self,runner):
         lineno = vim.current.window.cursor[0]
-        line = vim.current.buffer[lineno-1]
-        pointer_index = line.find(vdebug.opts.Options.get('marker_closed_tree'))
-        step = len(vdebug.opts.Options.get('marker_closed_tree')) + 1
-
-        eq_index = line.find('=')
-        if eq_index == -1:
+        node = runner.ui.watchwin.get_node(lineno)
+        if node is None:
             raise EventError("Cannot read the selected property")
 
-        name = line[pointer_index+step:eq_index-1]
-        context_res = runner.api.property_get(name)
+        context_res = runner.api.property_get(node.name,0,runner.context_id)
+        rend = vdebug.ui.vimui.ContextGetResponseRenderer(context_res)
+        (lines, nodes) = rend.render_rows(node.level * 2)
+        runner.ui.watchwin.replace_node(lineno,lines,nodes)
+
+class WatchWindowLoadMoreEvent(Event):
+    """Load the next page of a property's children in the watch window.
+
+    The new children replace the "load more" row.
+    """
+    def execute(self,runner):
+        lineno = vim.current.window.cursor[0]
+        node = runner.ui.watchwin.get_node(lineno)
+        if node is None or not node.is_load_more():
+            raise EventError("Cannot find the property to load more of")
+
+        context_res = runner.api.property_get(node.name,node.page,\
+                runner.context_id)
+        rend = vdebug.ui.vimui.ContextGetResponseRenderer(context_res)
+        (lines, nodes) = rend.render_rows((node.level - 1) * 2,1)
+        runner.ui.watchwin.replace_node(lineno,lines,nodes)
+
+class WatchWindowExpandTreeEvent(Event):
+    """Open a tree node in the watch window along with its descendants,
+    down to a given depth, with a single property_get.
+
+    The depth is reduced if the node could have more descendants than
+    the "expand_node_budget" option allows, assuming that every node
+    has as many children as the debugger engine sends at a time.
+    """
+    def __init__(self,depth):
+        self.depth = depth
+
+    def execute(self,runner):
+        lineno = vim.current.window.cursor[0]
+        node = runner.ui.watchwin.get_node(lineno)
+        if node is None or not node.has_children:
+            raise EventError("Cannot expand the selected line")
+
+        depth = self.__limit_depth(runner)
+        if depth < self.depth:
+            runner.ui.say("Expanding %s to a depth of %i, to stay within "\
+                    "the node budget" %(node.name,depth))
+        context_res = runner.api.property_get_tree(node.name,depth,\
+                runner.context_id)
         rend = vdebug.ui.vimui.ContextGetResponseRenderer(context_res)
-        output = rend.render(pointer_index - 1)
-        runner.ui.watchwin.delete(lineno,lineno+1)
-        runner.ui.watchwin.insert(output.rstrip(),lineno-1,True)
+        (lines, nodes) = rend.render_rows(node.level * 2)
+        runner.ui.watchwin.replace_node(lineno,lines,nodes)
+        return True
+
+    def __limit_depth(self,runner):
+        budget = vdebug.opts.Options.get('expand_node_budget',int)
+        max_children = runner.api.feature_value('max_children')
+        if max_children is None:
+            max_children = vdebug.opts.Options.get('max_children',int)
+        max_children = max(int(max_children),1)
+
+        depth = 0
+        num_nodes = 0
+        level_nodes = 1
+        while depth < self.depth:
+            level_nodes *= max_children
+            if num_nodes + level_nodes > budget:
+                break
+            num_nodes += level_nodes
+            depth += 1
+        return max(depth,1)
 
 class WatchWindowHideEvent(Event):
     """Close a tree node in the watch window.
     """
     def execute(self,runner):
         lineno = vim.current.window.cursor[0]
-        line = vim.current.buffer[lineno-1]
-        pointer_index = line.find(vdebug.opts.Options.get('marker_open_tree'))
-
-        buf_len = len(vim.current.buffer)
-        end_lineno = buf_len - 1
-        for i in range(lineno,end_lineno):
-            buf_line = vim.current.buffer[i]
-            char = buf_line[pointer_index]
-            if char != " ":
-                end_lineno = i - 1
-                break
-        runner.ui.watchwin.delete(lineno,end_lineno+1)
-        if vdebug.opts.Options.get('watch_window_style') == 'expanded':
-            append = "\n" + "".rjust(pointer_index) + "|"
-        else:
-            append = ""
-        runner.ui.watchwin.insert(line.replace(\
-                    vdebug.opts.Options.get('marker_open_tree'),\
-                    vdebug.opts.Options.get('marker_closed_tree'),1) + \
-                append,lineno-1,True)
+        runner.ui.watchwin.collapse_node(lineno)
+
+class WatchWindowSearchEvent(Event):
+    """Search all of the lines in the watch window, including those that
+    aren't in the buffer, and move the cursor to the next match.
+    """
+    def __init__(self,pattern):
+        self.pattern = pattern
+
+    def execute(self,runner):
+        lineno = vim.current.window.cursor[0]
+        try:
+            found = runner.ui.watchwin.search(self.pattern,lineno)
+        except re.error as e:
+            runner.ui.error("Invalid search pattern: %s" % e)
+            return False
+        if not found:
+            runner.ui.error("Pattern not found: %s" % self.pattern)
+        return found
 
 class WatchWindowContextChangeEvent(Event):
     """Event used to trigger a watch window context change.
@@ -1,6 +1,7 @@
 import time
 import sys
 import os
+import threading
 
 class Logger:
     """ Abstract class for all logger implementations.
@@ -44,6 +45,7 @@ class WindowLogger(Logger):
     def __init__(self,debug_level,window):
         self.window = window
         self.debug_level = int(debug_level)
+        self.thread = threading.current_thread()
 
     def shutdown(self):
         if self.window is not None:
@@ -52,6 +54,9 @@ class WindowLogger(Logger):
     def log(self, string, level):
         if level > self.debug_level:
             return
+        if threading.current_thread() is not self.thread:
+            """ Vim can only be used from the thread that created the window """
+            return
         if not self.window.is_open:
             self.window.create()
         self.window.write(\
@@ -105,6 +110,14 @@ class Log:
         for k, l in cls.loggers.iteritems():
             l.log(string,level)
 
+    @classmethod
+    def is_enabled(cls, level):
+        """ Whether any logger will write messages of this level """
+        for k, l in cls.loggers.iteritems():
+            if level <= int(l.debug_level):
+                return True
+        return False
+
     @classmethod
     def set_logger(cls, logger):
         k = logger.__class__.__name__
@@ -18,6 +18,8 @@ class Runner:
 
     def __init__(self):
         self.api = None
+        self.listener = None
+        self.context_id = 0
         vdebug.opts.Options.set(vim.eval('g:vdebug_options'))
         self.breakpoints = vdebug.breakpoint.Store()
         self.keymapper = vdebug.util.Keymapper()
@@ -34,6 +36,7 @@ class Runner:
                 self.ui.error("Modified buffers must be saved before debugging")
                 return
             vdebug.opts.Options.set(vim.eval('g:vdebug_options'))
+            vdebug.util.FilePath.clear_cache()
             
             if vdebug.opts.Options.isset('debug_file'):
                 vdebug.log.Log.set_logger(vdebug.log.FileLogger(\
@@ -55,9 +58,19 @@ class Runner:
             vdebug.log.Log("Found connection from " + str(addr),vdebug.log.Logger.INFO)
             self.ui.set_conn_details(addr[0],addr[1])
 
+            self.api.demux.add_handler(vdebug.dbgp.Demultiplexer.STREAM,\
+                    self.handle_stream)
+            self.api.demux.add_handler(vdebug.dbgp.Demultiplexer.NOTIFY,\
+                    self.handle_notification)
             self.set_features()
-            self.breakpoints.update_lines(self.ui.get_breakpoint_sign_positions())
-            self.breakpoints.link_api(self.api)
+            self.set_output_redirection()
+            self.breakpoints.update_lines(self.ui.get_breakpoint_sign_lines())
+            failures = self.breakpoints.link_api(self.api)
+            if len(failures) > 0:
+                self.ui.error("Failed to set %i breakpoint(s): %s" \
+                        %(len(failures),", ".join(["%i (%s)" \
+                        %(bp.get_id(),error.args[0]) \
+                        for (bp, error) in failures])))
 
             cn_res = self.api.context_names()
             self.context_names = cn_res.names()
@@ -65,10 +78,9 @@ class Runner:
                     str(self.context_names),vdebug.log.Logger.DEBUG)
 
             if vdebug.opts.Options.get('break_on_open',int) == 1:
-                status = self.api.step_into()
+                self.continue_execution('step_into')
             else:
-                status = self.api.run()
-            self.refresh(status)
+                self.continue_execution('run')
         except Exception as e:
             self.close()
             raise e
@@ -78,8 +90,15 @@ class Runner:
 
         Errors are caught if the debugger doesn't like the feature name or
         value. This doesn't break the loop, so multiple features can be set
-        even in the case of an error."""
+        even in the case of an error.
+
+        The max_children and max_data options are sent as features too,
+        unless they are in the dictionary already."""
         features = vim.eval('g:vdebug_features')
+        for name in ('max_children','max_data'):
+            value = vdebug.opts.Options.get(name,int)
+            if value > 0 and name not in features:
+                features[name] = value
         for name, value in features.iteritems():
             try:
                 self.api.feature_set(name, value)
@@ -87,11 +106,33 @@ class Runner:
                 error_str = "Failed to set feature %s: %s" %(name,str(e.args[0]))
                 self.ui.error(error_str)
 
+    def set_output_redirection(self):
+        """Ask the debugger to send the program's output to Vim, if the
+        "redirect_stdout" option is set.
+
+        The output is shown in the output window."""
+        mode = vdebug.opts.Options.get('redirect_stdout',int)
+        if mode != 0:
+            try:
+                self.api.stdout(mode)
+            except (vdebug.dbgp.DBGPError,\
+                    vdebug.dbgp.CmdNotImplementedError) as e:
+                self.ui.error("Failed to redirect stdout: %s" \
+                        % str(e.args[0]))
+
+    def handle_stream(self,stream):
+        self.ui.outputwin.add_output(stream.text)
+
+    def handle_notification(self,notification):
+        vdebug.log.Log("Received %s notification from the debugger" \
+                % notification.name)
+
     def refresh(self,status):
         """The main action performed after a deubugger step.
     
         Updates the status window, current stack, source
         file and line and watch window."""    
+        self.ui.outputwin.flush()
         if not self.is_alive():
             self.ui.error("Cannot update: no connection")
         else:
@@ -108,31 +149,85 @@ class Runner:
                     self.open()
                     return
             else:
-                vdebug.log.Log("Getting stack information")
-                self.ui.statuswin.set_status(status)
-                stack_res = self.update_stack()
-                stack = stack_res.get_stack()
-
-                self.cur_file = vdebug.util.FilePath(stack[0].get('filename'))
-                self.cur_lineno = stack[0].get('lineno')
-
-                vdebug.log.Log("Moving to current position in source window")
-                self.ui.set_source_position(\
-                        self.cur_file,\
-                        self.cur_lineno)
-
-                self.get_context(0)
-
-    def get_context(self,context_id = 0):
-        self.ui.watchwin.clean()
+                vdebug.ui.vimui.vim_calls.begin_step()
+                try:
+                    self.show_position(status)
+                finally:
+                    vdebug.ui.vimui.vim_calls.end_step()
+
+    def show_position(self,status):
+        """Show the status, stack, source position and context after a
+        step."""
+        vdebug.log.Log("Getting stack information")
+        self.ui.statuswin.set_status(status)
+        (stack_res, context_res) = self.api.stack_and_context_get(0)
+        self.update_stack(stack_res)
+        stack = stack_res.get_stack()
+
+        self.cur_file = vdebug.util.FilePath(stack[0].get('filename'))
+        self.cur_lineno = stack[0].get('lineno')
+
+        vdebug.log.Log("Moving to current position in source window")
+        self.ui.set_source_position(\
+                self.cur_file,\
+                self.cur_lineno)
+
+        self.get_context(0,context_res)
+
+    def get_context(self,context_id = 0,context_res = None):
+        """Show the variables for a context in the watch window.
+
+        The context is fetched from the debugger, unless the response
+        has already been retrieved and is passed as context_res.
+
+        If the watch window is already showing the context, the trees
+        that are open in it are opened again, and only the rows that
+        have changed are rewritten.
+        """
+        watchwin = self.ui.watchwin
+        is_update = watchwin.is_open and watchwin.context_id == context_id
+        if not is_update:
+            watchwin.clean()
+        self.context_id = context_id
         name = self.context_names[context_id]
         vdebug.log.Log("Getting %s variables" % name)
-        context_res = self.api.context_get(context_id)
+        if context_res is None:
+            context_res = self.api.context_get(context_id)
         rend = vdebug.ui.vimui.ContextGetResponseRenderer(\
                 context_res,"%s at %s:%s" \
                 %(name,self.ui.sourcewin.file,self.cur_lineno),\
                 self.context_names, context_id)
-        self.ui.watchwin.accept_renderer(rend)
+        if is_update:
+            lines = rend.render_lines()
+            tree = vdebug.ui.vimui.WatchTree(rend.line_nodes)
+            self.open_trees(lines,tree,watchwin.open_names())
+            watchwin.update(lines,tree.nodes)
+        else:
+            watchwin.accept_renderer(rend)
+        watchwin.context_id = context_id
+
+    def open_trees(self,lines,tree,names):
+        """Open the trees of the named properties in the watch window
+        lines and tree, before they are shown, fetching their children.
+
+        A tree inside another is opened once the outer one has been.
+        """
+        names = set(names)
+        while len(names) > 0:
+            indexes = [i for (i, node) in enumerate(tree.nodes) \
+                    if node is not None and node.name in names \
+                    and node.has_children and not node.is_open]
+            if len(indexes) == 0:
+                break
+            """ Work upwards, so that the indexes still to do don't move """
+            for index in reversed(indexes):
+                node = tree.get_node(index)
+                names.discard(node.name)
+                res = self.api.property_get(node.name,0,self.context_id)
+                rend = vdebug.ui.vimui.ContextGetResponseRenderer(res)
+                (rows, nodes) = rend.render_rows(node.level * 2)
+                end = tree.replace_block(index,nodes)
+                lines[index:end] = rows
 
     def toggle_breakpoint_window(self):
         """Open or close the breakpoint window.
@@ -161,8 +256,7 @@ class Runner:
         else:
             vdebug.log.Log("Running")
             self.ui.statuswin.set_status("running")
-            res = self.api.run()
-            self.refresh(res)
+            self.continue_execution('run')
 
     def step_over(self):
         """Step over to the next statement."""
@@ -171,8 +265,7 @@ class Runner:
         else:
             vdebug.log.Log("Stepping over")
             self.ui.statuswin.set_status("running")
-            res = self.api.step_over()
-            self.refresh(res)
+            self.continue_execution('step_over')
 
     def step_into(self):
         """Step into the next statement."""
@@ -181,8 +274,7 @@ class Runner:
         else:
             vdebug.log.Log("Stepping into statement")
             self.ui.statuswin.set_status("running")
-            res = self.api.step_into()
-            self.refresh(res)
+            self.continue_execution('step_into')
 
     def step_out(self):
         """Step out of the current context."""
@@ -191,9 +283,52 @@ class Runner:
         else:
             vdebug.log.Log("Stepping out of statement")
             self.ui.statuswin.set_status("running")
-            res = self.api.step_out()
+            self.continue_execution('step_out')
+
+    def break_execution(self):
+        """Tell the debugger engine to break, if it's running.
+
+        The refresh happens as normal when the engine responds to the
+        command that it was running."""
+        if not self.is_alive():
+            self.ui.error("Cannot break: no debugger connection")
+        elif not self.api.is_busy():
+            self.ui.error("Cannot break: the debugger engine is not running")
+        else:
+            vdebug.log.Log("Breaking")
+            if not self.api.break_execution():
+                vdebug.log.Log("The debugger engine had already stopped")
+
+    def continue_execution(self,cmd):
+        """Send a command that makes the debugger execute, e.g. run or
+        step_over, and refresh when the engine breaks.
+
+        If the "async_run" option is enabled (and Vim has timers), the
+        response is waited for in the background and picked up by
+        poll(), so that Vim stays usable while the engine executes.
+        """
+        if vdebug.opts.Options.get('async_run',int) == 1 and \
+                self.ui.can_poll():
+            self.api.send_cmd_async(cmd,'',vdebug.dbgp.StatusResponse)
+            self.ui.start_polling()
+        else:
+            res = self.api.send_cmd(cmd,'',vdebug.dbgp.StatusResponse)
             self.refresh(res)
 
+    def poll(self):
+        """Check whether the debugger engine has responded to a command
+        sent by continue_execution(), and refresh if it has.
+
+        This is called repeatedly by a Vim timer."""
+        if not self.is_alive() or not self.api.is_busy():
+            self.ui.stop_polling()
+            return
+        self.api.dispatch_packets()
+        self.ui.outputwin.flush_if_due()
+        if self.api.pending.is_ready():
+            self.ui.stop_polling()
+            self.refresh(self.api.recv_pending())
+
     def remove_breakpoint(self,args):
         """Remove a breakpoint, by ID or "*"."""
         if args is None:
@@ -271,7 +406,8 @@ class Runner:
                     check_ide_key = False
                     
                 connection = vdebug.dbgp.Connection(server,port,\
-                        timeout,vdebug.util.InputStream())
+                        timeout,vdebug.util.InputStream(),\
+                        self.get_listener(server,port))
 
                 self.api = vdebug.dbgp.Api(connection)
                 if check_ide_key and ide_key != self.api.idekey:
@@ -280,15 +416,41 @@ class Runner:
                     self.api.detach()
                 else:
                     break
+            if vdebug.opts.Options.get('continuous_mode', int) == 0:
+                self.stop_listener()
+
+    def get_listener(self,server,port):
+        """Get the listener for the server and port.
 
-    def update_stack(self):
+        The listener is kept between sessions, so that in continuous mode
+        the port stays bound and engine connections made between sessions
+        wait in its backlog.
+        """
+        if self.listener is not None and \
+                not self.listener.listens_on(server,port):
+            self.stop_listener()
+        if self.listener is None:
+            self.listener = vdebug.dbgp.Listener(server,port)
+        return self.listener
+
+    def stop_listener(self):
+        """Stop listening for debugger connections."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def update_stack(self,res = None):
         """Update the stack window with the current stack info.
+
+        The stack is fetched from the debugger, unless the response has
+        already been retrieved and is passed as res.
         """
         if not self.is_alive():
             self.ui.error("Cannot update the stack: no debugger connection")
         else:
             self.ui.stackwin.clean()
-            res = self.api.stack_get()
+            if res is None:
+                res = self.api.stack_get()
             renderer = vdebug.ui.vimui.StackGetResponseRenderer(res)
             self.ui.stackwin.accept_renderer(renderer)
             return res
@@ -306,11 +468,15 @@ class Runner:
         """ Close the connection to the debugger.
         """
         self.breakpoints.unlink_api()
+        self.ui.stop_polling()
         self.ui.mark_as_stopped()
         try:
             if self.is_alive():
                 vdebug.log.Log("Closing the connection")
-                if stop:
+                if stop and self.api.is_busy():
+                    vdebug.log.Log("The debugger engine is running, "+\
+                            "so the connection will be dropped")
+                elif stop:
                     if vdebug.opts.Options.get('on_close') == 'detach':
                         try:
                             self.api.detach()
@@ -335,5 +501,6 @@ class Runner:
         """ Close both the connection and vdebug.ui.
         """
         self.close_connection()
+        self.stop_listener()
         self.ui.close()
         self.keymapper.unmap()
@@ -4,22 +4,169 @@ import vdebug.util
 import vim
 import vdebug.log
 import vdebug.opts
+import time
+import re
+import sys
+import difflib
+import bisect
+
+class VimCalls:
+    """Makes the calls into Vim for the UI, counting them.
+
+    While a debugger step is being shown (between begin_step() and
+    end_step()), commands are queued and run together in a single call,
+    with 'lazyredraw' set, when the step ends or before anything is read
+    from Vim. Going to a window is also put off until a command has to be
+    run in it, and focus is returned to the starting window once, at the
+    end of the step.
+    """
+    def __init__(self):
+        self.num_calls = 0
+        self.step_calls = 0
+        self.commands = None
+        self.depth = 0
+        self.current = None
+        self.wanted = None
+        self.start_window = None
+        self.lazyredraw = None
+        self.window_numbers = {}
+
+    def in_step(self):
+        return self.commands is not None
+
+    def begin_step(self):
+        """Start queueing commands, until end_step() is called."""
+        self.depth += 1
+        if self.depth > 1:
+            return
+        self.step_calls = self.num_calls
+        (self.lazyredraw, self.start_window) = \
+                self.eval('[&lazyredraw,winnr()]')
+        self.current = self.wanted = self.start_window
+        self.window_numbers = {}
+        self.commands = ['set lazyredraw']
+
+    def end_step(self):
+        """Run the queued commands, and return to the starting window.
+
+        Returns the number of calls into Vim made during the step."""
+        self.depth -= 1
+        if self.depth > 0:
+            return
+        try:
+            self.flush()
+        finally:
+            """ Restore separately, so that it's done even if one of the
+            queued commands failed """
+            restore = ['let &lazyredraw = %s' % self.lazyredraw]
+            if self.current != self.start_window:
+                restore.append('%swincmd w' % self.start_window)
+            self.commands = None
+            self.current = self.wanted = None
+            self.window_numbers = {}
+            self.num_calls += 1
+            vim.command(" | ".join(restore))
+        self.step_calls = self.num_calls - self.step_calls
+        vdebug.log.Log("Made %i calls to Vim for the step" % \
+                self.step_calls,vdebug.log.Logger.DEBUG)
+        return self.step_calls
+
+    def command(self,cmd):
+        if self.commands is None:
+            self.num_calls += 1
+            vim.command(cmd)
+        else:
+            self.__go_to_wanted()
+            self.commands.append(cmd)
+
+    def eval(self,expr):
+        self.sync()
+        self.num_calls += 1
+        return vim.eval(expr)
+
+    def focus(self,winnr):
+        """Go to a window, or during a step, go to it when a command
+        is next run."""
+        winnr = str(winnr)
+        if self.commands is None:
+            self.command('%swincmd w' % winnr)
+        else:
+            self.wanted = winnr
+
+    def window(self):
+        """The number of the current window."""
+        if self.commands is None or self.wanted is None:
+            return self.eval('winnr()')
+        return self.wanted
+
+    def window_number(self,name):
+        """The number of the window showing a buffer, which is only
+        looked up once during a step."""
+        if self.commands is not None and name in self.window_numbers:
+            return self.window_numbers[name]
+        """ Queued commands don't open or close windows, so they don't
+        have to be run first """
+        self.num_calls += 1
+        winnr = int(vim.eval("bufwinnr('"+name+"')"))
+        if self.commands is not None:
+            self.window_numbers[name] = winnr
+        return winnr
+
+    def forget_windows(self):
+        """Forget the window numbers, after a window is opened or
+        closed."""
+        self.current = self.wanted = None
+        self.window_numbers = {}
+
+    def sync(self):
+        """Run the queued commands, before Vim is used directly."""
+        if self.commands is not None:
+            self.__go_to_wanted()
+            self.flush()
+
+    def flush(self):
+        if self.commands:
+            cmds = self.commands
+            self.commands = []
+            self.num_calls += 1
+            try:
+                vim.command(" | ".join(["exe '%s'" % c.replace("'","''") \
+                        for c in cmds]))
+            except:
+                """ The rest of the commands were skipped, so the current
+                window isn't known """
+                self.current = None
+                raise
+
+    def __go_to_wanted(self):
+        if self.wanted is not None and self.wanted != self.current:
+            self.commands.append('%swincmd w' % self.wanted)
+            self.current = self.wanted
+
+vim_calls = VimCalls()
 
 class Ui(vdebug.ui.interface.Ui):
     """Ui layer which manages the Vim windows.
     """
 
+    poll_interval = 100
+    sign_regex = re.compile('line=(\d+)\s+id=(\d+)')
+
     def __init__(self,breakpoints):
         vdebug.ui.interface.Ui.__init__(self)
         self.is_open = False
         self.breakpoint_store = breakpoints
         self.emptybuffer = None
         self.breakpointwin = BreakpointWindow(self,'rightbelow 7new')
+        self.outputwin = OutputWindow(self,'rightbelow 10new')
         self.current_tab = "1"
         self.tabnr = None
+        self.poll_timer = None
+        self.breakpoint_signs = {}
+        self.has_sign_getplaced = None
 
     def is_modified(self):
-       modified = int(vim.eval('&mod'))
+       modified = int(vim_calls.eval('&mod'))
        if modified:
            return True
        else:
@@ -31,14 +178,14 @@ class Ui(vdebug.ui.interface.Ui):
         self.is_open = True
         
         try:
-            cur_buf_name = vim.eval("bufname('%')")
+            cur_buf_name = vim_calls.eval("bufname('%')")
             if cur_buf_name is None:
                 cur_buf_name = ''
 
-            self.current_tab = vim.eval("tabpagenr()")
+            self.current_tab = vim_calls.eval("tabpagenr()")
 
-            vim.command('silent tabnew ' + cur_buf_name)
-            self.tabnr = vim.eval("tabpagenr()")
+            vim_calls.command('silent tabnew ' + cur_buf_name)
+            self.tabnr = vim_calls.eval("tabpagenr()")
 
             srcwin_name = self.__get_srcwin_name()
 
@@ -103,7 +250,7 @@ class Ui(vdebug.ui.interface.Ui):
         return self.get_line(self.get_current_row())
 
     def get_line(self,row):
-        return vim.eval("getline(" + str(row) + ")")
+        return vim_calls.eval("getline(" + str(row) + ")")
 
     def register_breakpoint(self,breakpoint):
         if breakpoint.type == 'line':
@@ -113,33 +260,86 @@ class Ui(vdebug.ui.interface.Ui):
             self.breakpointwin.add_breakpoint(breakpoint)
 
     def place_breakpoint(self,sign_id,file,line):
-        vim.command('sign place '+str(sign_id)+\
+        vim_calls.command('sign place '+str(sign_id)+\
                 ' name=breakpt line='+str(line)+\
                 ' file='+file.as_local())
+        self.breakpoint_signs.setdefault(file.as_local(),{})[str(sign_id)] \
+                = int(line)
 
     def remove_breakpoint(self,breakpoint):
         id = breakpoint.id
-        vim.command('sign unplace %i' % id)
+        vim_calls.command('sign unplace %i' % id)
+        if breakpoint.type == 'line':
+            file = breakpoint.file.as_local()
+            if file in self.breakpoint_signs:
+                self.breakpoint_signs[file].pop(str(id),None)
+                if len(self.breakpoint_signs[file]) == 0:
+                    del self.breakpoint_signs[file]
         if self.breakpointwin.is_open:
             self.breakpointwin.remove_breakpoint(id)
 
-    def get_breakpoint_sign_positions(self):
-        sign_lines = self.command('sign place').split("\n")
-        positions = {}
-        for line in sign_lines:
-            if "name=breakpt" in line:
-                attributes = line.strip().split()
-                lineinfo = attributes[0].split('=')
-                idinfo = attributes[1].split('=')
-                positions[idinfo[1]] = lineinfo[1]
-        return positions
+    def can_poll(self):
+        """Whether Vim supports timers, which are needed for polling."""
+        return int(vim_calls.eval("has('timers')")) == 1
+
+    def start_polling(self):
+        """Start a Vim timer that repeatedly calls debugger.poll()."""
+        if self.poll_timer is None:
+            self.poll_timer = vim_calls.eval(\
+                    "timer_start(%i,'vdebug:poll',{'repeat':-1})" \
+                    % self.poll_interval)
+
+    def stop_polling(self):
+        if self.poll_timer is not None:
+            vim_calls.command('call timer_stop(%s)' % self.poll_timer)
+            self.poll_timer = None
+
+    def get_breakpoint_sign_lines(self):
+        """Get the lines that the breakpoint signs are on, which may
+        have moved as the files were edited.
+
+        Returns a dict of file names to dicts of sign IDs and lines. Only
+        the buffers with breakpoint signs are looked at, using
+        sign_getplaced() if Vim has it.
+        """
+        files = self.breakpoint_signs.keys()
+        if len(files) == 0:
+            return self.breakpoint_signs
+        if self.has_sign_getplaced is None:
+            self.has_sign_getplaced = \
+                    int(vim_calls.eval("exists('*sign_getplaced')")) == 1
+        if self.has_sign_getplaced:
+            placed = vim_calls.eval("map(%s,'bufexists(v:val) ? "\
+                    "sign_getplaced(v:val) : []')" % self.__vim_list(files))
+            for (file, buffers) in zip(files,placed):
+                self.__update_sign_lines(file,[(sign['id'], sign['lnum']) \
+                        for buf in buffers for sign in buf['signs']])
+        else:
+            exists = vim_calls.eval("map(%s,'bufexists(v:val)')" \
+                    % self.__vim_list(files))
+            for (file, exist) in zip(files,exists):
+                if int(exist):
+                    output = self.command('sign place file=%s' % file)
+                    self.__update_sign_lines(file,[(id, line) for \
+                            (line, id) in self.sign_regex.findall(output)])
+        return self.breakpoint_signs
+
+    def __update_sign_lines(self,file,id_lines):
+        signs = self.breakpoint_signs[file]
+        for (id, line) in id_lines:
+            if str(id) in signs:
+                signs[str(id)] = int(line)
+
+    def __vim_list(self,strings):
+        return "[" + ",".join(["'%s'" % s.replace("'","''") \
+                for s in strings]) + "]"
 
     # Execute a vim command and return the output.
     def command(self,cmd):
-        vim.command('redir => _tmp')
-        vim.command('silent %s' % cmd)
-        vim.command('redir END')
-        return vim.eval('_tmp')
+        vim_calls.command('redir => _tmp')
+        vim_calls.command('silent %s' % cmd)
+        vim_calls.command('redir END')
+        return vim_calls.eval('_tmp')
 
     def say(self,string):
         """ Vim picks up Python prints, so just print """
@@ -147,7 +347,7 @@ class Ui(vdebug.ui.interface.Ui):
         vdebug.log.Log(string,vdebug.log.Logger.INFO)
 
     def error(self,string):
-        vim.command('echohl Error | echo "'+\
+        vim_calls.command('echohl Error | echo "'+\
                 str(string).replace('"','\\"')+\
                 '" | echohl None')
         vdebug.log.Log(string,vdebug.log.Logger.ERROR)
@@ -163,12 +363,14 @@ class Ui(vdebug.ui.interface.Ui):
             self.stackwin.destroy()
         if self.statuswin:
             self.statuswin.destroy()
+        if self.outputwin.is_open:
+            self.outputwin.destroy()
 
         vdebug.log.Log.remove_logger('WindowLogger')
         if self.tabnr:
-            vim.command('silent! '+self.tabnr+'tabc!')
+            vim_calls.command('silent! '+self.tabnr+'tabc!')
         if self.current_tab:
-            vim.command('tabn '+self.current_tab)
+            vim_calls.command('tabn '+self.current_tab)
 
         self.watchwin = None
         self.stackwin = None
@@ -195,7 +397,7 @@ class Ui(vdebug.ui.interface.Ui):
         return i
 
     def __get_buf_list(self):
-        return vim.eval("range(1, bufnr('$'))")
+        return vim_calls.eval("range(1, bufnr('$'))")
 
 class SourceWindow(vdebug.ui.interface.Window):
 
@@ -207,13 +409,13 @@ class SourceWindow(vdebug.ui.interface.Window):
         self.winno = str(winno)
 
     def focus(self):
-        vim.command(self.winno+"wincmd w")
+        vim_calls.focus(self.winno)
 
     def command(self,cmd,silent = True):
         self.focus()
         prepend = "silent " if silent else ""
         command_str = prepend + self.winno + "wincmd " + cmd
-        vim.command(command_str)
+        vim_calls.command(command_str)
 
     def set_file(self,file):
         if file == self.file:
@@ -221,30 +423,30 @@ class SourceWindow(vdebug.ui.interface.Window):
         self.file = file
         vdebug.log.Log("Setting source file: "+file,vdebug.log.Logger.INFO)
         self.focus()
-        vim.command("silent edit " + file)
+        vim_calls.command("silent edit " + file)
 
     def set_line(self,lineno):
         self.focus()
-        vim.command("normal %sgg" % str(lineno))
+        vim_calls.command("normal %sgg" % str(lineno))
 
     def get_file(self):
         self.focus()
-        self.file = vdebug.util.FilePath(vim.eval("expand('%:p')"))
+        self.file = vdebug.util.FilePath(vim_calls.eval("expand('%:p')"))
         return self.file
 
     def clear_signs(self):
-        vim.command('sign unplace *')
+        vim_calls.command('sign unplace *')
 
     def place_pointer(self,line):
         vdebug.log.Log("Placing pointer sign on line "+str(line),\
                 vdebug.log.Logger.INFO)
         self.remove_pointer()
-        vim.command('sign place '+self.pointer_sign_id+\
+        vim_calls.command('sign place '+self.pointer_sign_id+\
                 ' name=current line='+str(line)+\
                 ' file='+self.file)
 
     def remove_pointer(self):
-        vim.command('sign unplace %s' % self.pointer_sign_id)
+        vim_calls.command('sign unplace %s' % self.pointer_sign_id)
 
 class Window(vdebug.ui.interface.Window):
     name = "WINDOW"
@@ -258,57 +460,50 @@ class Window(vdebug.ui.interface.Window):
         self.is_open = False
 
     def getwinnr(self):
-        return int(vim.eval("bufwinnr('"+self.name+"')"))
+        return vim_calls.window_number(self.name)
 
     def set_height(self,height):
         self.command('set winheight=%s' % str(height))
 
     def write(self, msg, return_focus = True, after = "normal G"):
+        self.write_lines(str(msg).split('\n'),return_focus,after)
+
+    def write_lines(self, lines, return_focus = True, after = "normal G"):
+        """Write a list of lines, in a single buffer update."""
         if not self.is_open:
             self.create()
         if return_focus:
-            prev_win = vim.eval('winnr()')
+            prev_win = vim_calls.window()
         if self.buffer_empty():
-            self.buffer[:] = str(msg).split('\n')
+            self.buffer[:] = lines
         else:
-            self.buffer.append(str(msg).split('\n'))
+            self.buffer.append(lines)
         self.command(after)
         if return_focus:
-            vim.command('%swincmd W' % prev_win)
+            vim_calls.focus(prev_win)
 
     def insert(self, msg, lineno = None, overwrite = False, allowEmpty = False):
         if not self.is_open:
             self.create()
-        """ insert into current position in buffer"""
+        """ insert into current position in buffer, with a single
+        slice assignment so that the rest of the buffer isn't copied"""
         if len(msg) == 0 and allowEmpty == False:
             return
         if self.buffer_empty():
             self.buffer[:] = str(msg).split('\n')
         else:
             if lineno == None:
+                vim_calls.sync()
                 (lineno, rol) = vim.current.window.cursor
-            remaining_buffer = str(msg).split('\n')
             if overwrite:
                 lfrom = lineno + 1
             else:
                 lfrom = lineno
-            remaining_buffer.extend(self.buffer[lfrom:])
-            del self.buffer[lineno:]
-            if self.buffer_empty():
-                self.buffer[:] = remaining_buffer
-            else:
-                for line in remaining_buffer:
-                    self.buffer.append(line)
+            self.buffer[lineno:lfrom] = str(msg).split('\n')
             self.command(str(lfrom))
 
     def delete(self,start_line,end_line):
-        try:
-            self.buffer[end_line]
-            remaining_buffer = self.buffer[end_line:]
-            del self.buffer[start_line:]
-            self.buffer.append(remaining_buffer)
-        except IndexError:
-            del self.buffer[start_line:]
+        del self.buffer[start_line:end_line]
 
     def buffer_empty(self):
         if len(self.buffer) == 1 \
@@ -319,9 +514,11 @@ class Window(vdebug.ui.interface.Window):
 
     def create(self):
         """ create window """
-        vim.command('silent ' + self.open_cmd + ' ' + self.name)
-        vim.command("setlocal buftype=nofile modifiable "+ \
+        vim_calls.command('silent ' + self.open_cmd + ' ' + self.name)
+        vim_calls.command("setlocal buftype=nofile modifiable "+ \
                 "winfixheight winfixwidth")
+        vim_calls.forget_windows()
+        vim_calls.sync()
         self.buffer = vim.current.buffer
         self.is_open = True
         self.creation_count += 1
@@ -333,6 +530,8 @@ class Window(vdebug.ui.interface.Window):
             return
         self.is_open = False
         self.command('bwipeout ' + self.name)
+        vim_calls.forget_windows()
+        vim_calls.sync()
 
     def clean(self):
         """ clean all datas in buffer """
@@ -341,29 +540,40 @@ class Window(vdebug.ui.interface.Window):
     def command(self, cmd):
         """ go to my window & execute command """
         winnr = self.getwinnr()
-        if winnr != int(vim.eval("winnr()")):
-            vim.command(str(winnr) + 'wincmd w')
-        vim.command(cmd)
+        if vim_calls.in_step() or winnr != int(vim_calls.eval("winnr()")):
+            vim_calls.focus(winnr)
+        vim_calls.command(cmd)
 
     def accept_renderer(self,renderer):
-        self.write(renderer.render())
+        self.write_lines(renderer.render_lines())
 
 class BreakpointWindow(Window):
+    """Window listing the breakpoints, in order of ID.
+
+    The IDs shown are kept in order in self.ids, so that the line of a
+    breakpoint is found without reading the buffer.
+    """
     name = "DebuggerBreakpoints"
     is_visible = False
     header = """===========================================================
  ID      | TYPE        | DATA
 ==========================================================="""
+    num_header_lines = 3
+
+    def __init__(self,ui,open_cmd):
+        Window.__init__(self,ui,open_cmd)
+        self.ids = []
 
     def on_create(self):
         self.clean()
+        self.ids = []
         self.write(self.header)
         self.command('setlocal syntax=debugger_breakpoint')
         for bp in self.ui.breakpoint_store.get_sorted_list():
             self.add_breakpoint(bp)
         if self.creation_count == 1:
             cmd = 'silent! au BufWinLeave %s :silent! bdelete %s' %(self.name,self.name)
-            vim.command('%s | python debugger.runner.ui.breakpointwin.is_open = False' % cmd)
+            vim_calls.command('%s | python debugger.runner.ui.breakpointwin.is_open = False' % cmd)
 
     def add_breakpoint(self,breakpoint):
         bp_str = " %-7i | %-11s | " %(breakpoint.id,breakpoint.type)
@@ -378,16 +588,19 @@ class BreakpointWindow(Window):
                 breakpoint.type == 'return':
             bp_str += "Function: %s" % breakpoint.function
 
-        self.write(bp_str)
+        i = bisect.bisect_left(self.ids,breakpoint.id)
+        self.ids.insert(i,breakpoint.id)
+        if i == len(self.ids) - 1:
+            self.write(bp_str)
+        else:
+            lineno = self.num_header_lines + i
+            self.buffer[lineno:lineno] = [bp_str]
 
     def remove_breakpoint(self,breakpoint_id):
-        i = 0
-        for l in self.buffer:
-            bp_str = " %i " % breakpoint_id
-            bp_id_len = len(bp_str)
-            if l[:bp_id_len] == bp_str:
-                del self.buffer[i]
-            i += 1
+        i = bisect.bisect_left(self.ids,breakpoint_id)
+        if i < len(self.ids) and self.ids[i] == breakpoint_id:
+            del self.ids[i]
+            del self.buffer[self.num_header_lines + i]
 
 class LogWindow(Window):
     name = "DebuggerLog"
@@ -395,11 +608,59 @@ class LogWindow(Window):
     def on_create(self):
         self.command('setlocal syntax=debugger_log')
         if self.creation_count == 1:
-            vim.command('silent! au BufWinLeave %s :silent! bdelete %s' %(self.name,self.name))
+            vim_calls.command('silent! au BufWinLeave %s :silent! bdelete %s' %(self.name,self.name))
 
     def write(self, msg, return_focus = True):
         Window.write(self, msg,return_focus=True)
 
+class OutputWindow(Window):
+    """Window showing output streamed from the program being debugged.
+
+    Output is buffered, and written at most once every flush_interval
+    seconds (or when flush() is called), by appending to the end of the
+    buffer. This avoids a window update for every stream packet.
+    """
+    name = "DebuggerOutput"
+    flush_interval = 0.2
+
+    def __init__(self,ui,open_cmd):
+        Window.__init__(self,ui,open_cmd)
+        self.pending = []
+        self.last_flush = 0
+
+    def on_create(self):
+        self.clean()
+        if self.creation_count == 1:
+            cmd = 'silent! au BufWinLeave %s :silent! bdelete %s' %(self.name,self.name)
+            vim_calls.command('%s | python debugger.runner.ui.outputwin.is_open = False' % cmd)
+
+    def add_output(self,text):
+        self.pending.append(text)
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        """Write buffered output if the flush interval has passed."""
+        if time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write any buffered output to the window."""
+        self.last_flush = time.time()
+        if len(self.pending) == 0:
+            return
+        text = "".join(self.pending)
+        self.pending = []
+        if not self.is_open:
+            prev_win = vim_calls.window()
+            self.create()
+            vim_calls.focus(prev_win)
+        lines = text.split('\n')
+        """ The last line of the buffer is always the incomplete line
+        of output, so the new output carries on from it """
+        self.buffer[-1] = self.buffer[-1] + lines[0]
+        if len(lines) > 1:
+            self.buffer.append(lines[1:])
+
 class StackWindow(Window):
     name = "DebuggerStack"
 
@@ -413,13 +674,40 @@ class StackWindow(Window):
         self.command('setlocal syntax=debugger_stack')
         if self.creation_count == 1:
             cmd = 'silent! au BufWinLeave %s :silent! bdelete %s' %(self.name,self.name)
-            vim.command('%s | python debugger.runner.ui.stackwin.is_open = False' % cmd)
+            vim_calls.command('%s | python debugger.runner.ui.stackwin.is_open = False' % cmd)
 
     def write(self, msg, return_focus = True):
         Window.write(self, msg, after="normal gg")
 
 class WatchWindow(Window):
+    """Window showing a context or eval result as a tree.
+
+    All of the lines are kept in self.lines, with the nodes shown on them
+    in self.tree. If there are more lines than the watch_window_max_lines
+    option, only that many are put in the buffer, with a placeholder line
+    for those above and below them. The lines in the buffer are moved
+    when the cursor gets near a placeholder, or by a search.
+
+    When the window is updated after a step, only the rows that have
+    changed are rewritten, and they are highlighted (the indexes of the
+    highlighted rows are in self.changed).
+    """
     name = "DebuggerWatch"
+    placeholder_above = "  [%i more lines above]"
+    placeholder_below = "  [%i more lines below]"
+    match_id = 6147
+    max_highlights = 100
+
+    def __init__(self,ui,open_cmd):
+        Window.__init__(self,ui,open_cmd)
+        self.tree = WatchTree()
+        self.lines = []
+        self.first = 0
+        self.last = 0
+        self.changed = set()
+        self.is_highlighted = False
+        self.is_following_cursor = False
+        self.context_id = None
 
     def on_create(self):
         self.command('inoremap <buffer> <cr> <esc>'+\
@@ -429,13 +717,356 @@ class WatchWindow(Window):
         self.command('nnoremap <buffer> <2-LeftMouse> '+\
                 ':python debugger.handle_double_click()<cr>')
         self.command('setlocal syntax=debugger_watch')
+        self.is_following_cursor = False
+        self.__follow_cursor(self.is_virtual())
         if self.creation_count == 1:
             cmd = 'silent! au BufWinLeave %s :silent! bdelete %s' %(self.name,self.name)
-            vim.command('%s | python debugger.runner.ui.watchwin.is_open = False' % cmd)
+            vim_calls.command('%s | python debugger.runner.ui.watchwin.is_open = False' % cmd)
 
     def write(self, msg, return_focus = True):
         Window.write(self, msg, after="normal gg")
 
+    def write_lines(self, lines, return_focus = True, after = "normal gg"):
+        Window.write_lines(self, lines, return_focus, after)
+
+    def clean(self):
+        Window.clean(self)
+        self.tree = WatchTree()
+        self.lines = []
+        self.first = 0
+        self.last = 0
+        self.changed = set()
+        self.context_id = None
+
+    def accept_renderer(self,renderer):
+        self.clean()
+        self.lines = renderer.render_lines()
+        self.tree = WatchTree(renderer.line_nodes)
+        self.write_lines(self.__window_lines(0))
+        self.__highlight()
+
+    def update(self,lines,nodes):
+        """Show new lines, given with the nodes shown on them, rewriting
+        only the rows that differ from the lines shown now.
+
+        Rows are matched by the full names of their nodes, and the rows
+        that are new or have changed are highlighted."""
+        old_lines = self.lines
+        old_keys = self.__row_keys(old_lines,self.tree.nodes)
+        new_keys = self.__row_keys(lines,nodes)
+        was_virtual = self.is_virtual()
+        self.lines = lines
+        self.tree = WatchTree(nodes)
+        self.changed = set()
+        edits = []
+        matcher = difflib.SequenceMatcher(None,old_keys,new_keys)
+        for (tag, i1, i2, j1, j2) in matcher.get_opcodes():
+            if tag == 'equal':
+                for k in range(i2 - i1):
+                    if old_lines[i1 + k] != lines[j1 + k]:
+                        self.__add_edit(edits,i1 + k,i1 + k + 1,\
+                                j1 + k,j1 + k + 1)
+            else:
+                self.__add_edit(edits,i1,i2,j1,j2)
+        for (i1, i2, j1, j2) in edits:
+            self.changed.update([j for j in range(j1,j2) \
+                    if nodes[j] is not None])
+        if not was_virtual and len(lines) <= self.__max_lines():
+            for (i1, i2, j1, j2) in reversed(edits):
+                self.buffer[i1:i2] = lines[j1:j2]
+            self.last = len(lines)
+        else:
+            self.buffer[:] = self.__window_lines(self.first)
+        self.__highlight()
+
+    def open_names(self):
+        """The names of the nodes with open trees."""
+        return [node.name for node in self.tree.nodes \
+                if node is not None and node.has_children and node.is_open]
+
+    def is_virtual(self):
+        """Whether only some of the lines are in the buffer."""
+        return self.first > 0 or self.last < len(self.lines)
+
+    def get_line_index(self,lineno):
+        """Get the index in self.lines of a buffer line (starting at 1),
+        or None if the line is a placeholder."""
+        index = self.first + lineno - 1
+        if self.first > 0:
+            index -= 1
+        if index < self.first or index >= self.last:
+            return None
+        return index
+
+    def get_lineno(self,index):
+        """Get the buffer line (starting at 1) of an index in self.lines,
+        which must be in the buffer."""
+        lineno = index - self.first + 1
+        if self.first > 0:
+            lineno += 1
+        return lineno
+
+    def get_node(self,lineno):
+        """Get the node shown on a line (starting at 1), or None."""
+        index = self.get_line_index(lineno)
+        if index is None:
+            return None
+        return self.tree.get_node(index)
+
+    def replace_node(self,lineno,lines,nodes):
+        """Replace the lines of a node and its subtree with new lines,
+        given with the nodes shown on them."""
+        index = self.get_line_index(lineno)
+        was_virtual = self.is_virtual()
+        end = self.tree.replace_block(index,nodes)
+        self.lines[index:end] = lines
+        moved = len(lines) - (end - index)
+        self.changed = set([i if i < index else i + moved \
+                for i in self.changed if i < index or i >= end])
+        if not was_virtual and len(self.lines) <= self.__max_lines():
+            self.buffer[index:end] = lines
+            self.last = len(self.lines)
+        else:
+            first = self.first
+            self.buffer[:] = self.__window_lines(first)
+            if self.first != first:
+                self.__move_cursor(index)
+        self.__highlight()
+
+    def collapse_node(self,lineno):
+        """Close the tree of a node, removing its subtree."""
+        index = self.get_line_index(lineno)
+        node = self.tree.get_node(index)
+        line = self.lines[index].replace(\
+                vdebug.opts.Options.get('marker_open_tree'),\
+                vdebug.opts.Options.get('marker_closed_tree'),1)
+        lines = [line]
+        nodes = [node.copy(False)]
+        if vdebug.opts.Options.get('watch_window_style') == 'expanded':
+            next_node = self.tree.get_node(index + node.num_lines)
+            if next_node is None:
+                next_level = None
+            else:
+                next_level = next_node.level
+            separator = self.__separator(node.level,next_level)
+            if separator is not None:
+                lines.append(separator)
+                nodes.append(None)
+        nodes[0].num_lines = len(lines)
+        self.replace_node(lineno,lines,nodes)
+
+    def follow_cursor(self):
+        """Move the lines in the buffer if the cursor is near a
+        placeholder, so that there are always lines to scroll to."""
+        if not self.is_virtual():
+            return
+        lineno = vim.current.window.cursor[0]
+        margin = self.__max_lines() / 4
+        if self.first > 0 and lineno <= margin + 1:
+            index = self.get_line_index(lineno)
+            if index is None:
+                index = self.first - 1
+        elif self.last < len(self.lines) and \
+                lineno >= len(self.buffer) - margin:
+            index = self.get_line_index(lineno)
+            if index is None:
+                index = self.last
+        else:
+            return
+        self.__show_around(index)
+
+    def show_line(self,index):
+        """Put the cursor on a line of self.lines, moving the lines in
+        the buffer if it isn't there."""
+        if index < self.first or index >= self.last:
+            self.__show_around(index)
+        else:
+            self.__move_cursor(index)
+
+    def search(self,pattern,lineno):
+        """Show the next line after a buffer line that matches a regular
+        expression, searching all lines rather than just the buffer.
+
+        Returns False if no lines match."""
+        regex = re.compile(pattern)
+        start = self.get_line_index(lineno)
+        if start is None:
+            start = self.first - 1 if lineno == 1 else self.last - 1
+        count = len(self.lines)
+        for i in range(1,count + 1):
+            index = (start + i) % count
+            if regex.search(self.lines[index]):
+                self.show_line(index)
+                return True
+        return False
+
+    def __max_lines(self):
+        max_lines = vdebug.opts.Options.get('watch_window_max_lines',int)
+        if max_lines <= 0:
+            return sys.maxint
+        return max_lines
+
+    def __window_lines(self,first):
+        """Choose the lines to put in the buffer, starting from an index
+        in self.lines, and return them with the placeholders."""
+        max_lines = self.__max_lines()
+        count = len(self.lines)
+        if count <= max_lines:
+            self.first = 0
+            self.last = count
+            self.__follow_cursor(False)
+            return self.lines
+        self.first = max(0,min(first,count - max_lines))
+        self.last = self.first + max_lines
+        self.__follow_cursor(True)
+        lines = self.lines[self.first:self.last]
+        if self.first > 0:
+            lines.insert(0,self.placeholder_above % self.first)
+        if self.last < count:
+            lines.append(self.placeholder_below % (count - self.last))
+        return lines
+
+    def __follow_cursor(self,follow):
+        """Add or remove the autocmd that calls follow_cursor() when the
+        cursor moves, which is only needed if some lines aren't in the
+        buffer."""
+        if follow == self.is_following_cursor or not self.is_open:
+            return
+        self.is_following_cursor = follow
+        self.command('augroup VdebugWatchCursor')
+        self.command('au! * <buffer>')
+        if follow:
+            self.command('au CursorMoved <buffer> '+\
+                    'python debugger.handle_watch_cursor_moved()')
+        self.command('augroup END')
+
+    def __show_around(self,index):
+        """Put the lines around an index in the buffer, with the cursor
+        on it."""
+        self.buffer[:] = self.__window_lines(index - self.__max_lines() / 2)
+        self.__move_cursor(index)
+        self.__highlight()
+
+    def __highlight(self):
+        """Highlight the changed rows that are in the buffer."""
+        linenos = [self.get_lineno(i) for i in sorted(self.changed) \
+                if i >= self.first and i < self.last]
+        if not self.is_highlighted and len(linenos) == 0:
+            return
+        self.command('silent! call matchdelete(%i)' % self.match_id)
+        self.is_highlighted = len(linenos) > 0
+        if self.is_highlighted:
+            pattern = '\\|'.join(['\\%%%il' % l \
+                    for l in linenos[:self.max_highlights]])
+            self.command("call matchadd('debuggerWatchChanged','%s',10,%i)"\
+                    %(pattern,self.match_id))
+
+    def __row_keys(self,lines,nodes):
+        """Keys for matching rows: the name of the node on a row, or for
+        other rows, the line and the name of the last node."""
+        keys = []
+        name = None
+        for (line, node) in zip(lines,nodes):
+            if node is None:
+                keys.append((line,name))
+            else:
+                name = node.name
+                keys.append(name)
+        return keys
+
+    def __add_edit(self,edits,i1,i2,j1,j2):
+        """Add a replacement of old rows i1 to i2 with new rows j1 to
+        j2, joining it to the last one if they are next to each other."""
+        if len(edits) > 0 and edits[-1][1] == i1 and edits[-1][3] == j1:
+            edits[-1] = (edits[-1][0],i2,edits[-1][2],j2)
+        else:
+            edits.append((i1,i2,j1,j2))
+
+    def __move_cursor(self,index):
+        self.command('call cursor(%i,col("."))' % self.get_lineno(index))
+
+    def __separator(self,level,next_level):
+        """The separator line between a row at one level and the next
+        row, for the expanded style."""
+        if next_level is None:
+            if level == 0:
+                return None
+            return "".rjust((level * 2) - 1) + " /"
+        elif level == next_level:
+            return "".rjust(level * 2) + " |"
+        elif level > next_level:
+            return "".rjust((level * 2) - 1) + " /"
+        else:
+            return "".rjust((level * 2) + 1) + " \\"
+
+class WatchTree:
+    """Model of the watch window, mapping each line to the node of the
+    property tree that it shows (or None, e.g. for separators).
+
+    Each node knows how many lines it covers, including the lines for
+    its subtree, so that a subtree can be found without reading the
+    buffer.
+    """
+    def __init__(self,nodes = None):
+        if nodes is None:
+            nodes = []
+        self.nodes = nodes
+
+    def get_node(self,index):
+        """Get the node on a line (starting at 0), or None."""
+        if 0 <= index < len(self.nodes):
+            return self.nodes[index]
+        return None
+
+    def replace_block(self,index,nodes):
+        """Replace the lines covered by the node on a line with new
+        lines, which are given as the nodes shown on them.
+
+        Nodes without a parent are given the replaced node's parent,
+        and the parent nodes are resized. Returns the end of the
+        replaced lines."""
+        node = self.nodes[index]
+        end = index + node.num_lines
+        for n in nodes:
+            if n is not None and n.parent is None:
+                n.parent = node.parent
+        self.nodes[index:end] = nodes
+
+        change = len(nodes) - node.num_lines
+        parent = node.parent
+        while parent is not None:
+            parent.num_lines += change
+            parent = parent.parent
+        return end
+
+class WatchNode:
+    """A property shown in the watch window."""
+    def __init__(self,name,level,has_children = False,is_open = False):
+        self.name = name
+        self.level = level
+        self.has_children = has_children
+        self.is_open = is_open
+        self.parent = None
+        self.num_lines = 1
+
+    def is_load_more(self):
+        return False
+
+    def copy(self,is_open):
+        node = WatchNode(self.name,self.level,self.has_children,is_open)
+        node.parent = self.parent
+        return node
+
+class LoadMoreNode(WatchNode):
+    """A "load more" row in the watch window, for the next page of the
+    parent node's children."""
+    def __init__(self,name,level,page):
+        WatchNode.__init__(self,name,level)
+        self.page = page
+
+    def is_load_more(self):
+        return True
+
 class StatusWindow(Window):
     name = "DebuggerStatus"
 
@@ -451,7 +1082,7 @@ class StatusWindow(Window):
         self.command('setlocal syntax=debugger_status')
         if self.creation_count == 1:
             cmd = 'au BufWinLeave %s :silent! bdelete %s' %(self.name,self.name)
-            vim.command('%s | python debugger.runner.ui.statuswin.is_open = False' % cmd)
+            vim_calls.command('%s | python debugger.runner.ui.statuswin.is_open = False' % cmd)
 
     def set_status(self,status):
         self.insert("Status: "+str(status),0,True)
@@ -464,6 +1095,9 @@ class ResponseRenderer:
     def render(self):
         pass
 
+    def render_lines(self):
+        return self.render().split('\n')
+
 class StackGetResponseRenderer(ResponseRenderer):
     def render(self):
         stack = self.response.get_stack()
@@ -485,49 +1119,148 @@ class ContextGetResponseRenderer(ResponseRenderer):
         self.title = title
         self.contexts = contexts
         self.current_context = current_context
+        self.line_nodes = []
 
-    def render(self,indent = 0):
-        res = self.__create_tabs()
-
-        if self.title:
-            res += "- %s\n\n" % self.title
+    def render(self,indent = 0,min_depth = 0):
+        """Render the properties, indented by the given number of
+        spaces. Properties above min_depth are left out, e.g. to render
+        only the children of a property."""
+        return "\n".join(self.render_lines(indent,min_depth))
 
-        properties = self.response.get_context()
-        num_props = len(properties)
-        vdebug.log.Log("Writing %i properties to the context window" % num_props,\
-                vdebug.log.Logger.INFO )
-        for idx, prop in enumerate(properties):
-            final = False
-            try:
-                next_prop = properties[idx+1]
-            except IndexError:
-                final = True
-                next_prop = None
-            res += self.__render_property(prop,next_prop,final,indent)
+    def render_lines(self,indent = 0,min_depth = 0):
+        """Render the properties as a list of lines, which give the
+        same as render() when joined with new lines.
 
-        vdebug.log.Log("Writing to context window:\n"+res,vdebug.log.Logger.DEBUG)
+        The node shown on each line is stored in line_nodes."""
+        lines = self.__create_tabs()
 
-        return res
+        if self.title:
+            lines.extend(["- %s" % self.title,""])
+
+        (rows, nodes) = self.render_rows(indent,min_depth)
+        self.line_nodes = [None] * len(lines) + nodes + [None]
+        lines.extend(rows)
+        lines.append("")
+
+        if vdebug.log.Log.is_enabled(vdebug.log.Logger.DEBUG):
+            vdebug.log.Log("Writing to context window:\n"+"\n".join(lines),\
+                    vdebug.log.Logger.DEBUG)
+
+        return lines
+
+    def render_rows(self,indent = 0,min_depth = 0):
+        """Render just the property rows, without the context tabs or
+        title.
+
+        Returns a tuple of the list of lines and a list of the node
+        shown on each line (or None)."""
+        self.__prepare(indent)
+        lines = []
+        nodes = []
+
+        """ Properties are rendered as they are parsed, looking one
+        ahead to see how the next property is indented """
+        properties = self.__with_page_rows(self.response.iter_context(),\
+                min_depth)
+        num_props = 0
+        prop = next(properties,None)
+        while prop is not None:
+            next_prop = next(properties,None)
+            self.__render_property(lines,nodes,prop,next_prop)
+            num_props += 1
+            prop = next_prop
+        self.__link_nodes(nodes)
+        vdebug.log.Log("Wrote %i properties to the context window" % num_props,\
+                vdebug.log.Logger.INFO )
+        return (lines, nodes)
+
+    def __link_nodes(self,nodes):
+        """Set the parent of each node, and the number of lines that
+        each node covers along with its subtree."""
+        open_nodes = []
+        for (i, node) in enumerate(nodes):
+            if node is None:
+                continue
+            while open_nodes and open_nodes[-1][1].level >= node.level:
+                (start, done) = open_nodes.pop()
+                done.num_lines = i - start
+            if open_nodes:
+                node.parent = open_nodes[-1][1]
+            open_nodes.append((i,node))
+        for (start, node) in open_nodes:
+            node.num_lines = len(nodes) - start
+
+    def __prepare(self,indent):
+        """Look up the options used for every property, once per
+        render."""
+        self.indent = indent
+        self.indents = {}
+        self.expanded = \
+                vdebug.opts.Options.get('watch_window_style') == 'expanded'
+        self.marker_default = vdebug.opts.Options.get('marker_default')
+        self.marker_closed = vdebug.opts.Options.get('marker_closed_tree')
+        self.marker_open = vdebug.opts.Options.get('marker_open_tree')
+        self.marker_load_more = vdebug.opts.Options.get('marker_load_more')
 
     def __create_tabs(self):
-        res = ""
+        lines = []
         if self.contexts:
+            res = ""
             for id,name in self.contexts.iteritems():
                 if self.current_context == id:
                     name = "*"+name
                 res += "[ %s ] " % name
-            res += "\n\n"
-        return res
-
-    def __render_property(self,p,next_p,last = False,indent = 0):
-        line = "%(indent)s %(marker)s %(name)s = (%(type)s) %(value)s\n" \
-                %{'indent':"".rjust((p.depth * 2)+indent),\
-                'marker':self.__get_marker(p),'name':p.display_name,\
-                'type':p.type_and_size(),'value':p.value}
+            lines.extend([res,""])
+        return lines
+
+    def __with_page_rows(self,properties,min_depth):
+        """Add a row after the children of each property that has more
+        pages of children to be loaded."""
+        paged = []
+        for p in properties:
+            while paged and paged[-1].depth >= p.depth:
+                yield LoadMoreRow(paged.pop())
+            if p.has_children and p.child_count() > 0 \
+                    and p.has_more_pages():
+                paged.append(p)
+            if p.depth >= min_depth:
+                yield p
+        while paged:
+            yield LoadMoreRow(paged.pop())
+
+    def __get_indent(self,num_spaces):
+        try:
+            return self.indents[num_spaces]
+        except KeyError:
+            self.indents[num_spaces] = "".rjust(num_spaces)
+            return self.indents[num_spaces]
+
+    def __render_property(self,lines,nodes,p,next_p):
+        depth = p.depth
+        level = depth + self.indent / 2
+        if isinstance(p,LoadMoreRow):
+            line = "%s %s load more (page %i of %i)" \
+                    %(self.__get_indent((depth * 2)+self.indent),\
+                    self.marker_load_more,p.page,p.num_pages)
+            node = LoadMoreNode(p.name,level,p.page - 1)
+        else:
+            line = "%s %s %s = (%s) %s" \
+                    %(self.__get_indent((depth * 2)+self.indent),\
+                    self.__get_marker(p),p.display_name,\
+                    p.type_and_size(),p.value)
+            node = WatchNode(p.display_name,level,p.has_children,\
+                    p.child_count() > 0)
+        if "\n" in line:
+            split_line = line.split("\n")
+            lines.extend(split_line)
+            nodes.append(node)
+            nodes.extend([None] * (len(split_line) - 1))
+        else:
+            lines.append(line)
+            nodes.append(node)
 
-        if vdebug.opts.Options.get('watch_window_style') == 'expanded':
-            depth = p.depth
-            if next_p and not last:
+        if self.expanded:
+            if next_p:
                 next_depth = next_p.depth
                 if depth == next_depth:
                     next_sep = "|"
@@ -539,16 +1272,28 @@ class ContextGetResponseRenderer(ResponseRenderer):
                     next_sep = "\\"
                     num_spaces = (depth * 2) + 1
 
-                line += "".rjust(num_spaces+indent) + " " + next_sep + "\n"
+                lines.append(self.__get_indent(num_spaces+self.indent) + \
+                        " " + next_sep)
+                nodes.append(None)
             elif depth > 0:
-                line += "".rjust((depth * 2) - 1 + indent) + " /" + "\n"
-        return line
+                lines.append(self.__get_indent((depth * 2) - 1 + self.indent)\
+                        + " /")
+                nodes.append(None)
 
     def __get_marker(self,property):
-        char = vdebug.opts.Options.get('marker_default')
+        char = self.marker_default
         if property.has_children:
             if property.child_count() == 0:
-                char = vdebug.opts.Options.get('marker_closed_tree')
+                char = self.marker_closed
             else:
-                char = vdebug.opts.Options.get('marker_open_tree')
+                char = self.marker_open
         return char
+
+class LoadMoreRow:
+    """A row in the watch window for loading the next page of a
+    property's children."""
+    def __init__(self,parent):
+        self.name = parent.display_name
+        self.depth = parent.depth + 1
+        self.page = parent.page + 2
+        self.num_pages = parent.num_pages
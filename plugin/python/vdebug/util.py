@@ -72,17 +72,50 @@ class FilePath:
     is_win = False
 
     """Normalizes a file name and allows for remote and local path mapping.
+
+    The local and remote names are cached for each file name, and the
+    path maps are read once, until clear_cache() is called (e.g. when the
+    "path_maps" option changes).
     """
+    cache = {}
+    path_maps = None
+    win_regex = re.compile('^/?[a-zA-Z]:')
+
     def __init__(self,filename):
         if filename is None or \
             len(filename) == 0:
             raise FilePathError("Missing or invalid file name")
+        try:
+            (self.local, self.remote, self.is_win) = FilePath.cache[filename]
+        except KeyError:
+            self.__parse(filename)
+            FilePath.cache[filename] = (self.local,self.remote,self.is_win)
+
+    @classmethod
+    def clear_cache(cls):
+        cls.cache = {}
+        cls.path_maps = None
+
+    @classmethod
+    def get_path_maps(cls):
+        """Get the maps from remote to local paths and back, as a tuple
+        of PathMap objects."""
+        if cls.path_maps is None:
+            if vdebug.opts.Options.isset('path_maps'):
+                maps = vdebug.opts.Options.get('path_maps', dict)
+            else:
+                maps = {}
+            cls.path_maps = (PathMap(maps,"remote","local"),\
+                    PathMap(dict([(l, r) for (r, l) in maps.items()]),\
+                    "local","remote"))
+        return cls.path_maps
+
+    def __parse(self,filename):
         filename = urllib.unquote(filename)
         if filename.startswith('file://'):
             filename = filename[7:]
 
-        p = re.compile('^/?[a-zA-Z]:')
-        if p.match(filename):
+        if self.win_regex.match(filename):
             self.is_win = True
             if filename[0] == "/":
                 filename = filename[1:]
@@ -93,39 +126,22 @@ class FilePath:
     def _create_local(self,f):
         """Create the file name as a locally valid version.
 
-        Uses the "local_path" and "remote_path" options.
+        Uses the "path_maps" option.
         """
         ret = f
         if ret[2] == "/":
             ret = ret.replace("/","\\")
-        
-        if vdebug.opts.Options.isset('path_maps'):
-            for remote, local in vdebug.opts.Options.get('path_maps', dict).items():
-                if remote in ret:
-                    vdebug.log.Log("Replacing remote path (%s) " % remote +\
-                            "with local path (%s)" % local ,\
-                            vdebug.log.Logger.DEBUG)
-                    ret = ret.replace(remote,local)
-                    break
-        return ret
+        return self.get_path_maps()[0].replace(ret)
 
     def _create_remote(self,f):
         """Create the file name valid for the remote server.
 
-        Uses the "local_path" and "remote_path" options.
+        Uses the "path_maps" option.
         """
         ret = f
         if ret[2] == "\\":
             ret = ret.replace("\\","/")
-
-        if vdebug.opts.Options.isset('path_maps'):
-            for remote, local in vdebug.opts.Options.get('path_maps', dict).items():
-                if local in ret:
-                    vdebug.log.Log("Replacing local path (%s) " % local +\
-                            "with remote path (%s)" % remote ,\
-                            vdebug.log.Logger.DEBUG)
-                    ret = ret.replace(local,remote)
-                    break
+        ret = self.get_path_maps()[1].replace(ret)
         if self.is_win:
             return "file:///"+ret
         else:
@@ -164,6 +180,37 @@ class FilePath:
     def __repr__(self):
         return str(self)
 
+class PathMap:
+    """Replaces the start of a path with another, using the longest of
+    the matching prefixes in a dict of prefixes to replacements.
+
+    Any Windows drive at the start of the path is skipped.
+    """
+    def __init__(self,replacements,name = "",replacement_name = ""):
+        self.replacements = replacements
+        self.name = name
+        self.replacement_name = replacement_name
+        prefixes = [p for p in replacements.keys() if len(p) > 0]
+        if len(prefixes) == 0:
+            self.regex = None
+        else:
+            prefixes.sort(key=len,reverse=True)
+            self.regex = re.compile('^(?:[a-zA-Z]:)?(' + \
+                    '|'.join([re.escape(p) for p in prefixes]) + ')')
+
+    def replace(self,path):
+        if self.regex is None:
+            return path
+        m = self.regex.match(path)
+        if m is None:
+            return path
+        prefix = m.group(1)
+        replacement = self.replacements[prefix]
+        vdebug.log.Log("Replacing %s path (%s) with %s path (%s)" \
+                %(self.name,prefix,self.replacement_name,replacement),\
+                vdebug.log.Logger.DEBUG)
+        return path[:m.start(1)] + replacement + path[m.end(1):]
+
 class FilePathError(Exception):
     pass
 
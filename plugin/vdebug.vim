@@ -91,7 +91,15 @@ let g:vdebug_options_defaults = {
 \    "marker_default" : '⬦',
 \    "marker_closed_tree" : '▸',
 \    "marker_open_tree" : '▾',
-\    "continuous_mode"  : 0
+\    "marker_load_more" : '…',
+\    "continuous_mode"  : 0,
+\    "async_run" : 0,
+\    "redirect_stdout" : 0,
+\    "max_children" : 32,
+\    "max_data" : 1024,
+\    "expand_depth" : 3,
+\    "expand_node_budget" : 2000,
+\    "watch_window_max_lines" : 0
 \}
 
 " Different symbols for non unicode Vims
@@ -99,6 +107,7 @@ if g:vdebug_force_ascii == 1
     let g:vdebug_options_defaults["marker_default"] = '*'
     let g:vdebug_options_defaults["marker_closed_tree"] = '+'
     let g:vdebug_options_defaults["marker_open_tree"] = '-'
+    let g:vdebug_options_defaults["marker_load_more"] = '...'
 endif
 
 let g:vdebug_options = extend(g:vdebug_options_defaults,g:vdebug_options)
@@ -120,6 +129,9 @@ command! -nargs=? Breakpoint python debugger.set_breakpoint(<q-args>)
 command! -nargs=? BreakpointRemove python debugger.remove_breakpoint(<q-args>)
 command! BreakpointWindow python debugger.toggle_breakpoint_window()
 command! -nargs=? VdebugEval python debugger.handle_eval(<q-args>)
+command! VdebugBreak python debugger.break_execution()
+command! -nargs=? VdebugExpand python debugger.expand_tree(<q-args>)
+command! -nargs=1 VdebugWatchSearch python debugger.watch_search(<q-args>)
 command! -nargs=+ -complete=customlist,s:OptionNames VdebugOpt python debugger.handle_opt(<f-args>)
 
 " Signs and highlighted lines for breakpoints, etc.
@@ -143,6 +155,10 @@ function! s:OptionNames(A,L,P)
     endif
 endfunction
 
+function! vdebug:poll(timer)
+    python debugger.poll()
+endfunction
+
 function! vdebug:get_visual_selection()
   let [lnum1, col1] = getpos("'<")[1:2]
   let [lnum2, col2] = getpos("'>")[1:2]
@@ -22,6 +22,7 @@ syn match debuggerWatchVarValue ')\zs.*$\ze'
 syn match debuggerWatchType '(\zs[^ )]\+)\ze' contained
 syn match debuggerWatchSize '\[\zs\d\+\ze\]' contained
 syn region debuggerWatchString start=+\s`+ skip=+\\`+ end=+`\s*$+
+syn match debuggerWatchPlaceholder '^\s\s\[\d\+ more lines \(above\|below\)\]$'
 
 
 hi def link debuggerWatchTitle Title
@@ -36,3 +37,5 @@ hi def link debuggerWatchVarName Identifier
 hi def link debuggerWatchJoiner Structure
 hi def link debuggerWatchNumber Number
 hi def link debuggerWatchSize Number
+hi def link debuggerWatchPlaceholder Comment
+hi def link debuggerWatchChanged DiffChange
@@ -4,6 +4,7 @@ if __name__ == "__main__":
 import unittest2 as unittest
 import vdebug.breakpoint
 import vdebug.util
+import vdebug.dbgp
 import base64
 from mock import Mock
 
@@ -186,3 +187,106 @@ class BreakpointTest(unittest.TestCase):
         self.assertRaisesRegexp(vdebug.breakpoint.BreakpointError,\
                 re, vdebug.breakpoint.Breakpoint.parse, ui, args)
 
+
+class StoreTest(unittest.TestCase):
+
+    def test_link_api_registers_breakpoints_in_batch(self):
+        """ Test that all breakpoints are sent to the debugger together,
+        and each receives its debugger ID."""
+        store = vdebug.breakpoint.Store()
+        bp1 = vdebug.breakpoint.ExceptionBreakpoint(Mock(),"FooException")
+        bp2 = vdebug.breakpoint.CallBreakpoint(Mock(),"myfunction")
+        store.add_breakpoint(bp1)
+        store.add_breakpoint(bp2)
+
+        api = Mock()
+        def breakpoint_set_batch(cmds):
+            responses = []
+            for cmd in cmds:
+                res = Mock()
+                res.get_id.return_value = 100 if "-x" in cmd else 200
+                responses.append(res)
+            return responses
+        api.breakpoint_set_batch.side_effect = breakpoint_set_batch
+        store.link_api(api)
+
+        self.assertEqual(api.breakpoint_set_batch.call_count,1)
+        self.assertFalse(api.breakpoint_set.called)
+        self.assertEqual(bp1.get_debugger_id(),100)
+        self.assertEqual(bp2.get_debugger_id(),200)
+
+    def test_update_lines_from_sign_index(self):
+        """ Test that line breakpoints are moved to the lines given for
+        their IDs, ignoring unknown IDs."""
+        store = vdebug.breakpoint.Store()
+        file = vdebug.util.FilePath("/path/to/file")
+        bp = vdebug.breakpoint.LineBreakpoint(Mock(),file,20)
+        store.add_breakpoint(bp)
+        store.update_lines({"/path/to/file":{str(bp.get_id()):25,\
+                "1":3}})
+        self.assertEqual(bp.get_line(),25)
+
+    def test_find_breakpoint_uses_file_and_line(self):
+        """ Test that a line breakpoint is found by its file and line,
+        including after its line has been updated."""
+        store = vdebug.breakpoint.Store()
+        file = vdebug.util.FilePath("/path/to/file")
+        bp = vdebug.breakpoint.LineBreakpoint(Mock(),file,20)
+        store.add_breakpoint(bp)
+        self.assertEqual(store.find_breakpoint(file,20),bp.get_id())
+        self.assertIsNone(store.find_breakpoint(file,21))
+        store.update_lines({"/path/to/file":{str(bp.get_id()):21}})
+        self.assertIsNone(store.find_breakpoint(file,20))
+        self.assertEqual(store.find_breakpoint(file,21),bp.get_id())
+        self.assertEqual(store.get_file_breakpoints(file),\
+                set([str(bp.get_id())]))
+
+    def test_remove_breakpoint_clears_indexes(self):
+        """ Test that a removed breakpoint can no longer be found."""
+        store = vdebug.breakpoint.Store()
+        file = vdebug.util.FilePath("/path/to/file")
+        bp1 = vdebug.breakpoint.LineBreakpoint(Mock(),file,20)
+        bp2 = vdebug.breakpoint.CallBreakpoint(Mock(),"myfunction")
+        store.add_breakpoint(bp1)
+        store.add_breakpoint(bp2)
+        store.remove_breakpoint(bp1)
+        self.assertIsNone(store.find_breakpoint(file,20))
+        self.assertEqual(store.get_file_breakpoints(file),set())
+        self.assertEqual(store.get_sorted_list(),[bp2])
+
+    def test_get_sorted_list(self):
+        """ Test that breakpoints are listed in order of ID."""
+        store = vdebug.breakpoint.Store()
+        bps = [vdebug.breakpoint.CallBreakpoint(Mock(),"f%i" % i) \
+                for i in range(3)]
+        for bp in reversed(bps):
+            store.add_breakpoint(bp)
+        self.assertEqual(store.get_sorted_list(),bps)
+
+    def test_link_api_returns_failed_breakpoints(self):
+        """ Test that a breakpoint the debugger fails to set is returned
+        with its error, and the others still get their debugger IDs."""
+        store = vdebug.breakpoint.Store()
+        bp1 = vdebug.breakpoint.ExceptionBreakpoint(Mock(),"FooException")
+        bp2 = vdebug.breakpoint.CallBreakpoint(Mock(),"myfunction")
+        store.add_breakpoint(bp1)
+        store.add_breakpoint(bp2)
+
+        api = Mock()
+        error = vdebug.dbgp.DBGPError("invalid breakpoint",200)
+        def breakpoint_set_batch(cmds):
+            responses = []
+            for cmd in cmds:
+                if "-x" in cmd:
+                    responses.append(error)
+                else:
+                    res = Mock()
+                    res.get_id.return_value = 200
+                    responses.append(res)
+            return responses
+        api.breakpoint_set_batch.side_effect = breakpoint_set_batch
+        failures = store.link_api(api)
+
+        self.assertEqual(failures,[(bp1,error)])
+        self.assertIsNone(bp1.get_debugger_id())
+        self.assertEqual(bp2.get_debugger_id(),200)
@@ -3,6 +3,8 @@ if __name__ == "__main__":
     sys.path.append('../plugin/python/')
 import unittest2 as unittest
 import vdebug.dbgp
+import threading
+import Queue
 from mock import MagicMock, patch
 
 class ApiTest(unittest.TestCase):      
@@ -41,6 +43,32 @@ class ApiTest(unittest.TestCase):
         self.p.status()
         self.p.conn.send_msg.assert_called_once_with('status -i 1')
 
+    def test_property_get_sends_page(self):
+        """Test that the property_get command asks for a page of
+        children after the first"""
+        self.p.conn.send_msg = MagicMock()
+        self.p.property_get('$big',2)
+        self.p.conn.send_msg.assert_called_once_with(\
+                'property_get -i 1 -n $big -d 0 -p 2')
+
+    def test_property_get_is_cached(self):
+        """Test that getting the same property twice only sends one
+        command, until the debugger engine executes again"""
+        self.p.conn.send_msg = MagicMock()
+        first = self.p.property_get('$x')
+        second = self.p.property_get('$x')
+        self.assertIs(first,second)
+        self.p.property_get('$x',0,1)
+        self.assertEqual(self.p.conn.send_msg.call_count,2)
+        self.assertEqual(self.p.property_cache.hits,1)
+        self.assertEqual(self.p.property_cache.misses,2)
+
+        self.p.step_over()
+        self.p.property_get('$x')
+        self.assertEqual(self.p.conn.send_msg.call_args[0][0],\
+                'property_get -i 4 -n $x -d 0')
+        self.assertEqual(self.p.property_cache.misses,3)
+
     def test_status_retval(self):
         """Test that the status command receives a message from the api."""
         self.p.conn.recv_msg.return_value = """<?xml
@@ -152,6 +180,179 @@ class ApiTest(unittest.TestCase):
         self.assertEqual(str(res),"iso-8859-1")
         self.assertEqual(res.is_supported(),1)
 
+    def test_send_cmds_sends_in_one_write(self):
+        """Test that send_cmds writes all commands at once, each
+        with its own transaction ID."""
+        self.p.conn.recv_msg.side_effect = [
+            self.__status_response('1','break'),
+            self.__status_response('2','stopping')]
+        self.p.send_cmds([('status','',vdebug.dbgp.StatusResponse),
+            ('stop','',vdebug.dbgp.StatusResponse)])
+        self.p.conn.send_msgs.assert_called_once_with(\
+                ['status -i 1','stop -i 2'])
+
+    def test_send_cmds_matches_transaction_ids(self):
+        """Test that responses are matched to their commands by
+        transaction ID, regardless of the order they arrive in."""
+        self.p.conn.recv_msg.side_effect = [
+            self.__status_response('2','stopping'),
+            self.__status_response('1','break')]
+        res = self.p.send_cmds([('status','',vdebug.dbgp.StatusResponse),
+            ('stop','',vdebug.dbgp.StatusResponse)])
+        self.assertEqual(str(res[0]),"break")
+        self.assertEqual(res[0].get_cmd(),"status")
+        self.assertEqual(str(res[1]),"stopping")
+        self.assertEqual(res[1].get_cmd(),"stop")
+
+    def test_send_cmds_unknown_transaction_id_raises_error(self):
+        """Test that a response with an unexpected transaction ID
+        raises an error."""
+        self.p.conn.recv_msg.side_effect = [
+            self.__status_response('5','break')]
+        re = "Unexpected transaction ID in response"
+        self.assertRaisesRegexp(vdebug.dbgp.ResponseError,re,\
+                self.p.send_cmds,[('status','',vdebug.dbgp.StatusResponse)])
+
+    def test_send_cmds_reads_all_responses_before_raising(self):
+        """Test that an error response is raised only after the other
+        responses have been read, so none are left on the connection."""
+        self.p.conn.recv_msg.side_effect = [
+            self.__error_response('1','breakpoint_set'),
+            self.__response('2','breakpoint_set')]
+        self.p.conn.recv_msg.reset_mock()
+        self.assertRaises(vdebug.dbgp.DBGPError,self.p.send_cmds,\
+                [('breakpoint_set','-t line',vdebug.dbgp.Response),\
+                ('breakpoint_set','-t line',vdebug.dbgp.Response)])
+        self.assertEqual(self.p.conn.recv_msg.call_count,2)
+
+    def test_breakpoint_set_batch_returns_errors(self):
+        """Test that a breakpoint that can't be set gets its error in
+        the list, and the other breakpoints are still set."""
+        self.p.conn.recv_msg.side_effect = [
+            self.__response('2','breakpoint_set'),
+            self.__error_response('1','breakpoint_set'),
+            self.__response('3','breakpoint_set')]
+        res = self.p.breakpoint_set_batch(['-t line','-t line','-t call'])
+        self.assertIsInstance(res[0],vdebug.dbgp.DBGPError)
+        self.assertEqual(res[0].args[0],"invalid breakpoint")
+        self.assertIsInstance(res[1],vdebug.dbgp.BreakpointSetResponse)
+        self.assertEqual(res[2].get_cmd_args(),'-t call')
+
+    def __error_response(self,trans_id,cmd):
+        return """<?xml version="1.0" encoding="iso-8859-1"?>
+            <response xmlns="urn:debugger_protocol_v1"
+            command="%s" transaction_id="%s"><error code="200"><message><![CDATA[invalid breakpoint]]></message></error></response>""" \
+            %(cmd,trans_id)
+
+    def test_property_get_tree_raises_max_depth_for_one_command(self):
+        """Test that property_get_tree sets max_depth, gets the property
+        and restores max_depth in one write."""
+        self.p.features['max_depth'] = '1'
+        self.p.conn.recv_msg.side_effect = [
+            self.__response('1','feature_set'),
+            self.__response('2','property_get'),
+            self.__response('3','feature_set')]
+        res = self.p.property_get_tree('$x',4)
+        self.p.conn.send_msgs.assert_called_once_with(\
+                ['feature_set -i 1 -n max_depth -v 4',\
+                'property_get -i 2 -n $x -d 0',\
+                'feature_set -i 3 -n max_depth -v 1'])
+        self.assertEqual(res.get_cmd(),'property_get')
+        self.assertIs(self.p.property_get_tree('$x',4),res)
+
+    def __response(self,trans_id,cmd):
+        return """<?xml version="1.0" encoding="iso-8859-1"?>
+            <response xmlns="urn:debugger_protocol_v1"
+            command="%s" transaction_id="%s"></response>""" \
+            %(cmd,trans_id)
+
+    def test_send_cmd_async_returns_response_later(self):
+        """Test that an asynchronous command's response is received
+        in the background and can be collected afterwards."""
+        release = threading.Event()
+        def recv_msg():
+            release.wait()
+            return self.__status_response('1','break')
+        self.p.conn.recv_msg.side_effect = recv_msg
+
+        pending = self.p.send_cmd_async('run','',vdebug.dbgp.StatusResponse)
+        self.p.conn.send_msg.assert_called_once_with('run -i 1')
+        self.assertFalse(pending.is_ready())
+        self.assertTrue(self.p.is_busy())
+
+        release.set()
+        res = self.p.recv_pending()
+        self.assertEqual(str(res),"break")
+        self.assertEqual(res.get_cmd(),"run")
+        self.assertFalse(self.p.is_busy())
+
+    def test_send_cmd_while_busy_raises_error(self):
+        """Test that no other command can be sent while waiting for an
+        asynchronous response."""
+        release = threading.Event()
+        def recv_msg():
+            release.wait()
+            return self.__status_response('1','break')
+        self.p.conn.recv_msg.side_effect = recv_msg
+
+        self.p.send_cmd_async('run','',vdebug.dbgp.StatusResponse)
+        try:
+            self.assertRaises(vdebug.dbgp.EngineBusyError,self.p.status)
+        finally:
+            release.set()
+            self.p.recv_pending()
+
+    def test_break_execution_while_running(self):
+        """Test that break is sent while a command is still running, and
+        that the original response is collected once both have been
+        answered."""
+        responses = Queue.Queue()
+        self.p.conn.recv_msg.side_effect = responses.get
+
+        pending = self.p.send_cmd_async('run','',vdebug.dbgp.StatusResponse)
+        self.assertTrue(self.p.break_execution())
+        self.p.conn.send_msg.assert_called_with('break -i 2')
+
+        responses.put(self.__status_response('2','break'))
+        self.assertFalse(pending.is_ready())
+        responses.put(self.__status_response('1','break'))
+        res = self.p.recv_pending()
+        self.assertEqual(res.get_cmd(),"run")
+        self.assertEqual(str(res),"break")
+
+    def test_break_execution_after_response(self):
+        """Test that break isn't sent once the engine has already
+        responded."""
+        self.p.conn.recv_msg.return_value = self.__status_response('1','break')
+        pending = self.p.send_cmd_async('run','',vdebug.dbgp.StatusResponse)
+        pending.received.wait()
+        self.p.conn.send_msg.reset_mock()
+        self.assertFalse(self.p.break_execution())
+        self.assertFalse(self.p.conn.send_msg.called)
+        self.p.recv_pending()
+
+    def test_break_execution_when_not_running_raises_error(self):
+        """Test that break can't be used if no command is running."""
+        self.assertRaises(vdebug.dbgp.DBGPError,self.p.break_execution)
+
+    def test_recv_pending_raises_receive_error(self):
+        """Test that an error raised while receiving in the background
+        is raised when collecting the response."""
+        self.p.conn.recv_msg.side_effect = EOFError('Socket Closed')
+        self.p.send_cmd_async('run','',vdebug.dbgp.StatusResponse)
+        self.assertRaises(EOFError,self.p.recv_pending)
+        self.assertFalse(self.p.is_busy())
+
+    def __status_response(self,trans_id,status):
+        return """<?xml
+            version="1.0" encoding="iso-8859-1"?>\n
+            <response command="status"
+                      xmlns="urn:debugger_api_v1"
+                      status="%s"
+                      reason="ok"
+                      transaction_id="%s">
+            </response>""" %(status,trans_id)
+
 class apiInvalidInitTest(unittest.TestCase):
 
     init_msg = """<?xml version="1.0"
@@ -3,6 +3,9 @@ if __name__ == "__main__":
     sys.path.append('../plugin/python/')
 import unittest2 as unittest
 import vdebug.dbgp
+import socket
+import time
+from mock import MagicMock
 
 class SocketMockError():
     pass
@@ -11,10 +14,12 @@ class SocketMock():
     def __init__(self):
         self.response = []
         self.last_msg = None
+        self.recv_count = 0
 
     def recv(self,length):
+        self.recv_count += 1
         ret = self.response[0]
-        if len(ret) >= length:
+        if len(ret) > 0:
             chars = ret[0:length]
             newval = ret[length:]
             if len(newval) > 0:
@@ -26,6 +31,11 @@ class SocketMock():
             self.response.pop(0)
             return ''
 
+    def recv_into(self,buf,length):
+        chars = self.recv(length)
+        buf[:len(chars)] = chars
+        return len(chars)
+
     def add_response(self,res):
         res = str(res)
         self.response.append(list(res))
@@ -37,6 +47,9 @@ class SocketMock():
     def get_last_sent(self):
         return self.last_msg
 
+    def shutdown(self,how):
+        pass
+
     def close(self):
         pass
 
@@ -74,6 +87,50 @@ class ConnectionTest(unittest.TestCase):
         response = self.conn.recv_msg()
         assert response == 'this is a longer message'
 
+    """
+    Test that consecutive messages received in a single chunk are
+    split, and the remainder is kept for the next read.
+    """
+    def test_read_multiple_in_one_chunk(self):
+        self.conn.sock.response.append(list('3\0foo\0' + '4\0barz\0'))
+
+        self.assertEqual(self.conn.recv_msg(),'foo')
+        self.assertEqual(self.conn.recv_msg(),'barz')
+        self.assertEqual(self.conn.sock.recv_count,1)
+
+    """
+    Test that a large message is read in chunks, rather than a byte at
+    a time.
+    """
+    def test_read_large_uses_few_recv_calls(self):
+        body = 'x' * 100000
+        self.conn.sock.add_response(len(body))
+        self.conn.sock.add_response(body)
+        self.conn.sock.add_response('\0')
+
+        response = self.conn.recv_msg()
+        self.assertEqual(response,body)
+        max_calls = len(body) / self.conn.recv_size + 8
+        self.assertLessEqual(self.conn.sock.recv_count,max_calls)
+
+    """
+    Test that the body is filled in place, in a buffer of exactly the
+    message length, rather than being built from copies.
+    """
+    def test_read_body_into_preallocated_buffer(self):
+        body = 'y' * 50000
+        self.conn.sock.add_response(len(body))
+        self.conn.sock.add_response(body)
+        self.conn.sock.add_response('\0')
+        self.conn.sock.recv_into = MagicMock(\
+                side_effect=self.conn.sock.recv_into)
+
+        response = self.conn.recv_msg()
+        self.assertIsInstance(response,bytearray)
+        self.assertEqual(len(response),len(body))
+        self.assertEqual(response,body)
+        self.assertTrue(self.conn.sock.recv_into.called)
+
     """
     Test that an EOFError is raised if the socket appears to be closed.
     """
@@ -90,3 +147,92 @@ class ConnectionTest(unittest.TestCase):
         self.conn.send_msg(cmd)
         sent = self.conn.sock.get_last_sent()
         assert sent == cmd+'\0'
+
+class InputStreamMock():
+    def __init__(self):
+        self.probe_count = 0
+
+    def probe(self):
+        self.probe_count += 1
+
+class ConnectionListenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.input_stream = InputStreamMock()
+        self.conn = vdebug.dbgp.Connection('localhost', 0, 1,\
+                self.input_stream)
+        self.serv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.serv.setblocking(0)
+        self.serv.bind(('localhost', 0))
+        self.serv.listen(5)
+
+    def tearDown(self):
+        self.serv.close()
+
+    """
+    Test that waiting for a connection sleeps between interrupt checks,
+    rather than spinning for the whole timeout.
+    """
+    def test_listen_idle_does_not_spin(self):
+        timeout = 0.3
+        start_cpu = time.clock()
+        self.assertRaises(socket.timeout,self.conn.listen,\
+                self.serv,timeout)
+        cpu_used = time.clock() - start_cpu
+
+        max_probes = int(timeout / self.conn.poll_interval) + 2
+        self.assertLessEqual(self.input_stream.probe_count,max_probes)
+        self.assertLess(cpu_used,timeout / 2)
+
+    """
+    Test that a pending connection is accepted.
+    """
+    def test_listen_accepts_connection(self):
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        client.connect(self.serv.getsockname())
+        try:
+            (sock, address) = self.conn.listen(self.serv,1)
+            self.assertIsNotNone(sock)
+            sock.close()
+        finally:
+            client.close()
+
+class ConnectionListenerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.listener = vdebug.dbgp.Listener('localhost', 0)
+        self.address = self.listener.start().getsockname()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.listener.stop()
+
+    def __connect_client(self):
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        client.connect(self.address)
+        self.clients.append(client)
+
+    """
+    Test that connections made before a session starts are queued by
+    a shared listener, which stays open between sessions.
+    """
+    def test_shared_listener_accepts_queued_connections(self):
+        self.__connect_client()
+        self.__connect_client()
+
+        for i in range(2):
+            conn = vdebug.dbgp.Connection('localhost', 0, 1, None,\
+                    self.listener)
+            conn.open()
+            self.assertTrue(conn.isconnected())
+            conn.close()
+            self.assertTrue(self.listener.is_listening())
+
+    """
+    Test that stopping the listener releases the server socket.
+    """
+    def test_stop(self):
+        self.listener.stop()
+        self.assertFalse(self.listener.is_listening())
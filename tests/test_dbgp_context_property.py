@@ -72,6 +72,26 @@ encoding="base64"><![CDATA[QWxs]]></property></property></response>""")
         self.assertEqual(prop.depth,0)
         self.assertTrue(prop.has_children)
         self.assertEqual(prop.child_count(),4)
+        self.assertEqual(prop.page,0)
+        self.assertEqual(prop.num_pages,1)
+        self.assertFalse(prop.has_more_pages())
+
+    def test_paged_children(self):
+        prop = self.__get_context_property(\
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1"
+xmlns:xdebug="http://xdebug.org/dbgp/xdebug"
+command="property_get" transaction_id="3"><property name="$big"
+fullname="$big" type="array" children="1" numchildren="5" page="1"
+pagesize="2"><property name="2" fullname="$big[2]"
+type="int"><![CDATA[2]]></property><property name="3" fullname="$big[3]"
+type="int"><![CDATA[3]]></property></property></response>""")
+
+        self.assertEqual(prop.child_count(),2)
+        self.assertEqual(prop.page,1)
+        self.assertEqual(prop.page_size,2)
+        self.assertEqual(prop.num_pages,3)
+        self.assertTrue(prop.has_more_pages())
 
 class ContextPropertyAltTest(unittest.TestCase):
     def __get_context_property(self,xml_string):
@@ -128,3 +148,50 @@ context="0"><property  type="int" children="0" size="0"><value><![CDATA[1]]></va
         self.assertEqual(prop.type,'str')
         self.assertFalse(prop.has_children)
 
+    def test_value_is_decoded_when_read(self):
+        prop = self.__get_context_property(\
+            """<?xml version="1.0" encoding="utf-8"?>
+<response xmlns="urn:debugger_protocol_v1" command="contex_get" context="0" transaction_id="13"><property  type="str" children="0" size="5"><value encoding="base64"><![CDATA[d29ybGQ=
+]]></value><name encoding="base64"><![CDATA[b2JqX3Zhcg==
+]]></name><fullname encoding="base64"><![CDATA[b2JqLm9ial92YXI=
+]]></fullname></property></response>""")
+
+        self.assertEqual(prop.table.values[prop.index],'d29ybGQ=\n')
+        self.assertEqual(prop.type_and_size(),'str [5]')
+        self.assertEqual(prop.table.values[prop.index],'d29ybGQ=\n')
+        self.assertEqual(prop.value,'`world`')
+        self.assertEqual(prop.table.values[prop.index],'`world`')
+
+    def test_scalar_size_is_decoded_length(self):
+        prop = self.__get_context_property(\
+            """<?xml version="1.0" encoding="utf-8"?>
+<response xmlns="urn:debugger_protocol_v1" command="contex_get" context="0" transaction_id="13"><property  type="scalar" children="0"><value encoding="base64"><![CDATA[aGVsbG8=
+]]></value><fullname encoding="base64"><![CDATA[bXl2YXI=
+]]></fullname></property></response>""")
+
+        self.assertEqual(prop.type_and_size(),'scalar [5]')
+        self.assertEqual(prop.table.values[prop.index],'aGVsbG8=\n')
+        self.assertEqual(prop.value,'`hello`')
+
+class ContextPropertyParserTest(unittest.TestCase):
+    def test_name_after_children(self):
+        """ Test properties whose names come after their children."""
+        response = vdebug.dbgp.ContextGetResponse(\
+            """<?xml version="1.0" encoding="utf-8"?>
+<response xmlns="urn:debugger_protocol_v1" command="contex_get" context="0" transaction_id="13"><property  pagesize="10" numchildren="2" children="1" type="list" page="0" size="2"><property  type="int" children="0" size="0"><value><![CDATA[1]]></value><name encoding="base64"><![CDATA[WzBd
+]]></name><fullname encoding="base64"><![CDATA[bXlsaXN0WzBd
+]]></fullname></property><property  type="int" children="0" size="0"><value><![CDATA[2]]></value><name encoding="base64"><![CDATA[WzFd
+]]></name><fullname encoding="base64"><![CDATA[bXlsaXN0WzFd
+]]></fullname></property><name encoding="base64"><![CDATA[bXlsaXN0
+]]></name><fullname encoding="base64"><![CDATA[bXlsaXN0
+]]></fullname></property></response>""","","",None)
+
+        props = list(response.iter_context())
+        self.assertEqual(len(props),3)
+        self.assertEqual(props[0].display_name,'mylist')
+        self.assertEqual(props[0].child_count(),2)
+        self.assertEqual(props[1].display_name,'mylist[0]')
+        self.assertEqual(props[1].value,'1')
+        self.assertEqual(props[1].depth,1)
+        self.assertEqual(props[2].display_name,'mylist[1]')
+        self.assertTrue(props[2].is_last_child)
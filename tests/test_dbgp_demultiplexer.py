@@ -0,0 +1,69 @@
+if __name__ == "__main__":
+    import sys
+    sys.path.append('../plugin/python/')
+import unittest2 as unittest
+import vdebug.dbgp
+import base64
+from mock import MagicMock
+
+class DemultiplexerTest(unittest.TestCase):
+    """Test the Demultiplexer class in the vdebug.dbgp module."""
+
+    response = """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="status"
+transaction_id="1" status="break" reason="ok"></response>"""
+
+    stream = """<?xml version="1.0" encoding="iso-8859-1"?>
+<stream xmlns="urn:debugger_protocol_v1" type="stdout"
+encoding="base64"><![CDATA[%s]]></stream>""" % \
+            base64.encodestring("Hello world\n")
+
+    notify = """<?xml version="1.0" encoding="iso-8859-1"?>
+<notify xmlns="urn:debugger_protocol_v1"
+xmlns:xdebug="http://xdebug.org/dbgp/xdebug"
+name="breakpoint_resolved"></notify>"""
+
+    def setUp(self):
+        self.conn = MagicMock()
+        self.demux = vdebug.dbgp.Demultiplexer(self.conn)
+
+    def test_packet_types(self):
+        """Test that packets are classified by their root tag."""
+        self.assertEqual(self.demux.get_packet_type(self.response),\
+                vdebug.dbgp.Demultiplexer.RESPONSE)
+        self.assertEqual(self.demux.get_packet_type(self.stream),\
+                vdebug.dbgp.Demultiplexer.STREAM)
+        self.assertEqual(self.demux.get_packet_type(bytearray(self.notify)),\
+                vdebug.dbgp.Demultiplexer.NOTIFY)
+
+    def test_invalid_packet_raises_error(self):
+        self.assertRaises(vdebug.dbgp.ResponseError,\
+                self.demux.get_packet_type,"no xml here")
+
+    def test_recv_response_skips_other_packets(self):
+        """Test that stream and notify packets received before a
+        response are queued, and the response is returned."""
+        self.conn.recv_msg.side_effect = [self.stream,self.notify,\
+                self.response]
+        self.assertEqual(self.demux.recv_response(),self.response)
+        self.assertEqual(len(self.demux.queue),2)
+
+    def test_dispatch_calls_handlers(self):
+        """Test that queued packets are passed to their handlers."""
+        streams = []
+        notifications = []
+        self.demux.add_handler(vdebug.dbgp.Demultiplexer.STREAM,\
+                streams.append)
+        self.demux.add_handler(vdebug.dbgp.Demultiplexer.NOTIFY,\
+                notifications.append)
+        self.conn.recv_msg.side_effect = [self.stream,self.notify,\
+                self.response]
+        self.demux.recv_response()
+        self.demux.dispatch()
+
+        self.assertEqual(len(streams),1)
+        self.assertEqual(streams[0].type,"stdout")
+        self.assertEqual(streams[0].text,"Hello world\n")
+        self.assertEqual(len(notifications),1)
+        self.assertEqual(notifications[0].name,"breakpoint_resolved")
+        self.assertEqual(len(self.demux.queue),0)
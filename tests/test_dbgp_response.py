@@ -62,6 +62,34 @@ class StatusResponseTest(unittest.TestCase):
         res = vdebug.dbgp.StatusResponse(response,"","",Mock())
         assert str(res) == "starting"
 
+    def test_status_is_read_without_parsing_xml(self):
+        response = """<?xml version="1.0" encoding="iso-8859-1"?>
+            <response xmlns="urn:debugger_protocol_v1"
+            command="run" transaction_id="3" status='break'
+            reason="ok"/>"""
+        res = vdebug.dbgp.StatusResponse(response,"","",Mock())
+        assert str(res) == "break"
+        assert res.xml is None
+
+    def test_error_tag_raises_exception(self):
+        response = """<?xml version="1.0" encoding="iso-8859-1"?>
+            <response xmlns="urn:debugger_protocol_v1"
+            command="status" transaction_id="4" status="stopping"><error
+            code="5"><message><![CDATA[command is not available]]>
+            </message></error></response>"""
+        re = "command is not available"
+        self.assertRaisesRegexp(vdebug.dbgp.DBGPError,re,\
+                vdebug.dbgp.StatusResponse,response,"","",Mock())
+
+    def test_entities_fall_back_to_xml(self):
+        response = """<?xml version="1.0" encoding="iso-8859-1"?>
+            <response xmlns="urn:debugger_protocol_v1"
+            command="status" transaction_id="1" status="st&amp;rting"
+            reason="ok"></response>"""
+        res = vdebug.dbgp.StatusResponse(response,"","",Mock())
+        assert str(res) == "st&rting"
+        assert res.xml is not None
+
 class FeatureResponseTest(unittest.TestCase): 
     """Test the behaviour of the FeatureResponse class."""
     def test_feature_is_supported(self):
@@ -82,6 +110,34 @@ class FeatureResponseTest(unittest.TestCase):
         res = vdebug.dbgp.FeatureGetResponse(response,"","",Mock())
         assert res.is_supported() == 0
 
+    def test_feature_text_is_read_without_parsing_xml(self):
+        response = """<?xml version="1.0" encoding="iso-8859-1"?>
+            <response xmlns="urn:debugger_protocol_v1" 
+            command="feature_get" transaction_id="2" 
+            feature_name="language_name" supported="1"><![CDATA[PHP]]></response>"""
+        res = vdebug.dbgp.FeatureGetResponse(response,"","",Mock())
+        assert str(res) == "PHP"
+        assert res.xml is None
+
+    def test_split_cdata_text_is_joined(self):
+        response = """<?xml version="1.0" encoding="iso-8859-1"?>
+            <response xmlns="urn:debugger_protocol_v1" 
+            command="feature_get" transaction_id="2" 
+            feature_name="language_name" supported="1"><![CDATA[a]]]]><![CDATA[>b]]></response>"""
+        res = vdebug.dbgp.FeatureGetResponse(response,"","",Mock())
+        assert str(res) == "a]]>b"
+
+class BreakpointSetResponseTest(unittest.TestCase): 
+    """Test the behaviour of the BreakpointSetResponse class."""
+    def test_get_id(self):
+        response = """<?xml version="1.0" encoding="iso-8859-1"?>
+            <response xmlns="urn:debugger_protocol_v1" 
+            command="breakpoint_set" transaction_id="5"
+            state="enabled" id="119920001"></response>"""
+        res = vdebug.dbgp.BreakpointSetResponse(response,"","",Mock())
+        assert res.get_id() == 119920001
+        assert res.xml is None
+
 class StackGetTest(unittest.TestCase): 
     """Test the behaviour of the StackGetResponse class."""
     def test_string_is_status_text(self):
@@ -188,6 +244,42 @@ type="uninitialized"></property></response>
         assert prop.has_children == False
         assert prop.size == "19"
 
+    def test_iter_context_matches_get_context(self):
+        res = vdebug.dbgp.ContextGetResponse(self.response,"","",Mock())
+        streamed = list(res.iter_context())
+        context = res.get_context()
+        assert_same_properties(self,streamed,context)
+
+    def test_iter_context_reuses_parsed_table(self):
+        res = vdebug.dbgp.ContextGetResponse(self.response,"","",Mock())
+        streamed = list(res.iter_context())
+        table = res.table
+        again = list(res.iter_context())
+        self.assertIs(again[0].table,table)
+        self.assertEqual(streamed,again)
+
+    def test_iter_context_in_small_chunks(self):
+        res = vdebug.dbgp.ContextGetResponse(self.response,"","",Mock())
+        parser = vdebug.dbgp.ContextPropertyParser(res)
+        parser.chunk_size = 7
+        streamed = list(parser.parse())
+        context = res.get_context()
+        assert_same_properties(self,streamed,context)
+
+    def test_iter_context_properties_share_a_table(self):
+        res = vdebug.dbgp.ContextGetResponse(self.response,"","",Mock())
+        streamed = list(res.iter_context())
+        self.assertEqual(streamed[1].children,streamed[2:6])
+        self.assertEqual(streamed[2].parent,streamed[1])
+        self.assertIs(streamed[2].table,streamed[1].table)
+        self.assertTrue(streamed[5].is_last_child)
+
+    def test_properties_are_views_without_dict(self):
+        res = vdebug.dbgp.ContextGetResponse(self.response,"","",Mock())
+        prop = res.get_context()[0]
+        self.assertFalse(hasattr(prop,'__dict__'))
+        self.assertEqual(prop,res.table.view(0))
+
 class ContextGetAlternateTest(unittest.TestCase):
     response = """<?xml version="1.0" encoding="utf-8"?>
 <response xmlns="urn:debugger_protocol_v1" command="context_get" context="0" transaction_id="15"><property  pagesize="10" numchildren="3" children="1" type="list" page="0" size="3"><name encoding="base64"><![CDATA[bXlsaXN0
@@ -204,3 +296,57 @@ class ContextGetAlternateTest(unittest.TestCase):
         assert len(context) == 3
         self.assertIsInstance(context[0],vdebug.dbgp.ContextProperty)
 
+    def test_iter_context_matches_get_context(self):
+        res = vdebug.dbgp.ContextGetResponse(self.response,"","",Mock())
+        streamed = list(res.iter_context())
+        context = res.get_context()
+        assert_same_properties(self,streamed,context)
+
+def assert_same_properties(test,streamed,context):
+    test.assertEqual(len(streamed),len(context))
+    for (s, c) in zip(streamed,context):
+        test.assertEqual(s.display_name,c.display_name)
+        test.assertEqual(s.type,c.type)
+        test.assertEqual(s.value,c.value)
+        test.assertEqual(s.depth,c.depth)
+        test.assertEqual(s.size,c.size)
+        test.assertEqual(s.has_children,c.has_children)
+        test.assertEqual(s.child_count(),c.child_count())
+        test.assertEqual(s.is_last_child,c.is_last_child)
+        test.assertEqual(s.type_and_size(),c.type_and_size())
+
+class PropertyTableMemoryTest(unittest.TestCase):
+    """Compare the memory used by the property table with objects that
+    store each property's attributes in a dict."""
+    num_children = 2000
+
+    def __response(self):
+        children = ''.join(["""<property name="%(i)i"
+            fullname="$big[%(i)i]" type="int"><![CDATA[%(i)i]]></property>""" \
+                    % {'i':i} for i in range(self.num_children)])
+        return """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="context_get"
+transaction_id="3" context="0"><property name="$big" fullname="$big"
+type="array" children="1" numchildren="%i">%s</property></response>""" \
+                % (self.num_children,children)
+
+    def __dict_property_size(self,prop):
+        class DictProperty:
+            pass
+        obj = DictProperty()
+        for attr in ('parent','type','display_name','encoding','depth',\
+                'size','value','is_last_child','num_declared_children',\
+                'has_children','num_loaded_children','num_crs'):
+            setattr(obj,attr,getattr(prop,attr))
+        obj.children = []
+        return sys.getsizeof(obj) + sys.getsizeof(obj.__dict__) + \
+                sys.getsizeof(obj.children)
+
+    def test_table_is_smaller_than_dict_properties(self):
+        res = vdebug.dbgp.ContextGetResponse(self.__response(),"","",Mock())
+        context = res.get_context()
+        self.assertEqual(len(context),self.num_children + 1)
+
+        table_size = res.table.memory_usage()
+        dict_size = sum([self.__dict_property_size(p) for p in context])
+        self.assertLess(table_size * 5,dict_size)
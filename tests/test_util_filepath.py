@@ -10,6 +10,7 @@ class LocalFilePathTest(unittest.TestCase):
 
     def setUp(self):
         vdebug.opts.Options.set({'path_maps':{}})
+        FilePath.clear_cache()
 
     def test_as_local(self):
         filename = "/home/user/some/path"
@@ -81,6 +82,7 @@ class LocalFilePathTest(unittest.TestCase):
 class RemotePathTest(unittest.TestCase):
     def setUp(self):
         vdebug.opts.Options.set({'path_maps':{'/remote1/':'/local1/', '/remote2/':'/local2/'}})
+        FilePath.clear_cache()
 
     def test_as_local(self):
         filename = "/remote1/path/to/file"
@@ -135,3 +137,35 @@ class RemotePathTest(unittest.TestCase):
         filename = "C:/local2/path/to/file"
         file = FilePath(filename)
         self.assertEqual("C:\\local2\\path\\to\\file",file.as_local())
+
+    def test_longest_prefix_is_used(self):
+        vdebug.opts.Options.set({'path_maps':{'/remote1/':'/local1/',\
+                '/remote1/sub/':'/elsewhere/'}})
+        FilePath.clear_cache()
+        file = FilePath("file:///remote1/sub/file")
+        self.assertEqual("/elsewhere/file",file.as_local())
+        file = FilePath("/elsewhere/file")
+        self.assertEqual("file:///remote1/sub/file",file.as_remote())
+
+    def test_only_prefix_is_replaced(self):
+        file = FilePath("/home/remote1/file")
+        self.assertEqual("/home/remote1/file",file.as_local())
+
+class FilePathCacheTest(unittest.TestCase):
+    def setUp(self):
+        vdebug.opts.Options.set({'path_maps':{'/remote1/':'/local1/'}})
+        FilePath.clear_cache()
+
+    def test_file_name_is_cached(self):
+        FilePath("file:///remote1/file")
+        self.assertEqual(FilePath.cache["file:///remote1/file"],\
+                ("/local1/file","file:///remote1/file",False))
+        file = FilePath("file:///remote1/file")
+        self.assertEqual("/local1/file",file.as_local())
+
+    def test_clear_cache_uses_new_path_maps(self):
+        FilePath("file:///remote1/file")
+        vdebug.opts.Options.overwrite('path_maps',{'/remote1/':'/local2/'})
+        FilePath.clear_cache()
+        file = FilePath("file:///remote1/file")
+        self.assertEqual("/local2/file",file.as_local())
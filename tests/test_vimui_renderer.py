@@ -0,0 +1,63 @@
+if __name__ == "__main__":
+    import sys
+    sys.path.append('../plugin/python/')
+import unittest2 as unittest
+import vdebug.dbgp
+import vdebug.opts
+import vdebug.ui.vimui
+from mock import Mock, patch
+
+class ContextGetResponseRendererTest(unittest.TestCase):
+    """Test the rendering of properties in the watch window."""
+
+    options = {'watch_window_style':'expanded',\
+            'marker_default':'*','marker_closed_tree':'+',\
+            'marker_open_tree':'-','marker_load_more':'...'}
+
+    def setUp(self):
+        vdebug.opts.Options.set(self.options)
+
+    def __response(self,num_children):
+        children = ''.join(['<property name="%(i)i" fullname="$big[%(i)i]" '\
+                'type="int"><![CDATA[%(i)i]]></property>' % {'i':i} \
+                for i in range(num_children)])
+        return vdebug.dbgp.ContextGetResponse("""<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="context_get"
+transaction_id="3" context="0"><property name="$big" fullname="$big"
+type="array" children="1" numchildren="%i">%s</property><property
+name="$str" fullname="$str" type="string" size="3"
+encoding="base64"><![CDATA[YQpi]]></property></response>""" \
+                % (num_children,children),"","",Mock())
+
+    def test_render_lines_matches_render(self):
+        renderer = vdebug.ui.vimui.ContextGetResponseRenderer(\
+                self.__response(2),"Title",{0:'Locals'},0)
+        lines = renderer.render_lines()
+        self.assertEqual(lines,[\
+                "[ *Locals ] ","",\
+                "- Title","",\
+                " - $big = (array [2]) ",\
+                "  \\",\
+                "   * $big[0] = (int) 0",\
+                "   |",\
+                "   * $big[1] = (int) 1",\
+                "  /",\
+                " * $str = (string [3]) `a",\
+                "b`",\
+                ""])
+        self.assertEqual(renderer.render(),"\n".join(lines))
+
+    def test_render_100k_properties(self):
+        """Render a large number of properties, checking that the
+        options aren't looked up for every one."""
+        num_children = 100000
+        renderer = vdebug.ui.vimui.ContextGetResponseRenderer(\
+                self.__response(num_children))
+        with patch('vdebug.opts.Options.get',\
+                side_effect=self.options.get) as get:
+            lines = renderer.render_lines()
+            self.assertLess(get.call_count,10)
+        """ Each property and separator is a line, the string value is
+        on two lines and there's an empty line at the end """
+        self.assertEqual(len(lines),(num_children + 2) * 2 + 1)
+        self.assertEqual(lines[-5],"   * $big[99999] = (int) 99999")
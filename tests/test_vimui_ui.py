@@ -0,0 +1,71 @@
+if __name__ == "__main__":
+    import sys
+    sys.path.append('../plugin/python/')
+import unittest2 as unittest
+import vdebug.ui.vimui
+import vdebug.breakpoint
+import vdebug.util
+import vdebug.opts
+from mock import Mock, patch
+
+class BreakpointSignTest(unittest.TestCase):
+    """Test the tracking of the lines that breakpoint signs are on."""
+
+    def setUp(self):
+        vdebug.opts.Options.set({'path_maps':{}})
+        self.vim_patcher = patch('vdebug.ui.vimui.vim')
+        self.vim = self.vim_patcher.start()
+        self.ui = vdebug.ui.vimui.Ui(Mock())
+        self.ui.breakpointwin.is_open = False
+        self.bp1 = vdebug.breakpoint.LineBreakpoint(self.ui,\
+                vdebug.util.FilePath("/path/to/a.php"),10)
+        self.bp2 = vdebug.breakpoint.LineBreakpoint(self.ui,\
+                vdebug.util.FilePath("/path/to/b.php"),20)
+        self.bp1.on_add()
+        self.bp2.on_add()
+
+    def tearDown(self):
+        self.vim_patcher.stop()
+
+    def test_placed_signs_are_indexed_by_file(self):
+        self.assertEqual(self.ui.breakpoint_signs,{\
+                "/path/to/a.php":{str(self.bp1.id):10},\
+                "/path/to/b.php":{str(self.bp2.id):20}})
+
+    def test_removed_signs_leave_index(self):
+        self.bp1.on_remove()
+        self.assertEqual(self.ui.breakpoint_signs,{\
+                "/path/to/b.php":{str(self.bp2.id):20}})
+
+    def test_sign_lines_from_sign_getplaced(self):
+        def eval(expr):
+            if expr == "exists('*sign_getplaced')":
+                return '1'
+            """ Each buffer's signs are only used for its own breakpoints """
+            buffers = [{'bufnr':'1','signs':[\
+                        {'id':str(self.bp1.id),'lnum':'12'},\
+                        {'id':str(self.bp2.id),'lnum':'20'},\
+                        {'id':'6145','lnum':'3'}]}]
+            return [buffers,buffers]
+        self.vim.eval.side_effect = eval
+        lines = self.ui.get_breakpoint_sign_lines()
+        self.assertEqual(lines,{\
+                "/path/to/a.php":{str(self.bp1.id):12},\
+                "/path/to/b.php":{str(self.bp2.id):20}})
+        expr = self.vim.eval.call_args[0][0]
+        self.assertTrue("'/path/to/a.php'" in expr)
+        self.assertTrue("sign_getplaced(v:val)" in expr)
+
+    def test_sign_lines_from_sign_place(self):
+        def eval(expr):
+            if expr == "exists('*sign_getplaced')":
+                return '0'
+            elif expr == '_tmp':
+                return "\n--- Signs ---\nSigns for /path/to/b.php:\n"+\
+                        "    line=25  id=%i  name=breakpt\n" % self.bp2.id
+            return ['1','1']
+        self.vim.eval.side_effect = eval
+        lines = self.ui.get_breakpoint_sign_lines()
+        self.assertEqual(lines["/path/to/b.php"],{str(self.bp2.id):25})
+        self.vim.command.assert_any_call(\
+                'silent sign place file=/path/to/b.php')
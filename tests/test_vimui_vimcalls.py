@@ -0,0 +1,128 @@
+if __name__ == "__main__":
+    import sys
+    sys.path.append('../plugin/python/')
+import unittest2 as unittest
+import vdebug.ui.vimui
+import vdebug.opts
+from mock import Mock, patch
+
+class VimCallsTest(unittest.TestCase):
+    """Test the counting and batching of calls into Vim."""
+
+    window_numbers = {"bufwinnr('DebuggerStatus')":'2',\
+            "bufwinnr('DebuggerStack')":'3',\
+            "bufwinnr('DebuggerWatch')":'4'}
+
+    def setUp(self):
+        vdebug.opts.Options.set({'watch_window_max_lines':'0'})
+        self.calls = vdebug.ui.vimui.VimCalls()
+        self.patcher = patch('vdebug.ui.vimui.vim_calls',self.calls)
+        self.patcher.start()
+        self.vim_patcher = patch('vdebug.ui.vimui.vim')
+        self.vim = self.vim_patcher.start()
+        self.vim.eval.side_effect = self.__eval
+        self.windows = []
+
+    def tearDown(self):
+        for window in self.windows:
+            window.buffer = None
+        self.vim_patcher.stop()
+        self.patcher.stop()
+
+    def __eval(self,expr):
+        if expr == '[&lazyredraw,winnr()]':
+            return ['0','1']
+        elif expr == 'winnr()':
+            return '1'
+        return self.window_numbers.get(expr,'')
+
+    def __window(self,cls):
+        window = cls(Mock(),"new")
+        window.is_open = True
+        window.buffer = ["Status: starting"]
+        self.windows.append(window)
+        return window
+
+    def test_commands_run_straight_away_outside_step(self):
+        self.calls.command('sign unplace 1')
+        self.calls.command('normal gg')
+        self.assertEqual(self.vim.command.call_count,2)
+        self.assertEqual(self.calls.num_calls,2)
+
+    def test_step_runs_commands_in_one_call(self):
+        self.calls.begin_step()
+        self.calls.command('sign unplace 1')
+        self.calls.command("echo 'hi'")
+        self.assertEqual(self.vim.command.call_count,0)
+        self.assertEqual(self.calls.end_step(),3)
+        self.assertEqual(self.vim.command.call_args_list,[\
+                (("exe 'set lazyredraw' | exe 'sign unplace 1' | "+\
+                "exe 'echo ''hi'''",),),\
+                (("let &lazyredraw = 0",),)])
+
+    def test_eval_runs_queued_commands_first(self):
+        self.calls.begin_step()
+        self.calls.command('redir => _tmp')
+        self.calls.eval('_tmp')
+        self.vim.command.assert_called_once_with(\
+                "exe 'set lazyredraw' | exe 'redir => _tmp'")
+        self.calls.end_step()
+        self.vim.command.assert_called_with("let &lazyredraw = 0")
+
+    def test_refresh_has_one_focus_round_trip(self):
+        statuswin = self.__window(vdebug.ui.vimui.StatusWindow)
+        stackwin = self.__window(vdebug.ui.vimui.StackWindow)
+        watchwin = self.__window(vdebug.ui.vimui.WatchWindow)
+        sourcewin = vdebug.ui.vimui.SourceWindow(Mock(),1)
+        self.calls.begin_step()
+        statuswin.set_status("break")
+        stackwin.write("[0] main @ /tmp/a.php:3")
+        sourcewin.set_file("/tmp/a.php")
+        sourcewin.set_line(3)
+        sourcewin.place_pointer(3)
+        watchwin.write_lines(["  [*Locals]","- Locals"])
+        self.assertEqual(self.calls.end_step(),6)
+        self.assertEqual(self.vim.command.call_count,2)
+        self.assertEqual(self.vim.eval.call_count,4)
+        cmd = self.vim.command.call_args_list[0][0][0]
+        self.assertEqual(cmd.split(" | "),[\
+                "exe 'set lazyredraw'",\
+                "exe '2wincmd w'",\
+                "exe '1'",\
+                "exe '3wincmd w'",\
+                "exe 'normal gg'",\
+                "exe '1wincmd w'",\
+                "exe 'silent edit /tmp/a.php'",\
+                "exe 'normal 3gg'",\
+                "exe 'sign unplace 6145'",\
+                "exe 'sign place 6145 name=current line=3 file=/tmp/a.php'",\
+                "exe '4wincmd w'",\
+                "exe 'normal gg'"])
+        self.vim.command.assert_called_with(\
+                "let &lazyredraw = 0 | 1wincmd w")
+
+    def test_end_step_resets_after_vim_error(self):
+        def command(cmd):
+            if 'nonsense' in cmd:
+                raise Exception("E492")
+        self.vim.command.side_effect = command
+        self.calls.begin_step()
+        self.calls.command('nonsense')
+        self.assertRaises(Exception,self.calls.end_step)
+        self.assertFalse(self.calls.in_step())
+        self.vim.command.assert_called_with(\
+                "let &lazyredraw = 0 | 1wincmd w")
+
+    def test_end_step_restores_after_failed_sync(self):
+        def command(cmd):
+            if 'nonsense' in cmd:
+                raise Exception("E492")
+        self.vim.command.side_effect = command
+        self.calls.begin_step()
+        self.calls.command('nonsense')
+        self.assertRaises(Exception,self.calls.eval,'_tmp')
+        self.calls.command('sign unplace 1')
+        self.calls.end_step()
+        self.assertEqual(self.vim.command.call_args_list[-2:],[\
+                (("exe '1wincmd w' | exe 'sign unplace 1'",),),\
+                (("let &lazyredraw = 0",),)])
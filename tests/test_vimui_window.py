@@ -0,0 +1,332 @@
+if __name__ == "__main__":
+    import sys
+    sys.path.append('../plugin/python/')
+import unittest2 as unittest
+import vdebug.ui.vimui
+import vdebug.dbgp
+import vdebug.opts
+import vdebug.breakpoint
+from mock import Mock, patch
+
+class BufferMock(list):
+    """A list that behaves like a Vim buffer, which always has at least
+    one line, and counts the calls that would cross into Vim."""
+    def __init__(self,lines):
+        list.__init__(self,lines)
+        self.num_calls = 0
+
+    def __setslice__(self,i,j,lines):
+        self.num_calls += 1
+        list.__setslice__(self,i,j,lines)
+        self.__keep_one_line()
+
+    def __delslice__(self,i,j):
+        self.num_calls += 1
+        list.__delslice__(self,i,j)
+        self.__keep_one_line()
+
+    def __delitem__(self,i):
+        self.num_calls += 1
+        list.__delitem__(self,i)
+        self.__keep_one_line()
+
+    def append(self,lines):
+        self.num_calls += 1
+        if isinstance(lines,list):
+            self.extend(lines)
+        else:
+            list.append(self,lines)
+
+    def __keep_one_line(self):
+        if len(self) == 0:
+            list.append(self,"")
+
+def mock_called_with(mock,*args):
+    return any([c[0] == args for c in mock.call_args_list])
+
+class WindowTest(unittest.TestCase):
+    """Test the buffer updates made by the Window class."""
+
+    def setUp(self):
+        self.window = vdebug.ui.vimui.Window(Mock(),"new")
+        self.window.is_open = True
+        self.window.command = Mock()
+        self.window.buffer = BufferMock(["line %i" % i \
+                for i in range(50000)])
+
+    def test_insert_is_one_buffer_update(self):
+        self.window.insert("new 1\nnew 2",1)
+        self.assertEqual(self.window.buffer[:4],\
+                ["line 0","new 1","new 2","line 1"])
+        self.assertEqual(len(self.window.buffer),50002)
+        self.assertEqual(self.window.buffer.num_calls,1)
+
+    def test_insert_overwrite_replaces_line(self):
+        self.window.insert("new 1\nnew 2",1,True)
+        self.assertEqual(self.window.buffer[:4],\
+                ["line 0","new 1","new 2","line 2"])
+        self.assertEqual(len(self.window.buffer),50001)
+        self.assertEqual(self.window.buffer.num_calls,1)
+
+    def test_delete_is_one_buffer_update(self):
+        self.window.delete(1,3)
+        self.assertEqual(self.window.buffer[:2],["line 0","line 3"])
+        self.assertEqual(len(self.window.buffer),49998)
+        self.assertEqual(self.window.buffer.num_calls,1)
+
+    def test_delete_past_end(self):
+        self.window.delete(49998,50005)
+        self.assertEqual(len(self.window.buffer),49998)
+
+class BreakpointWindowTest(unittest.TestCase):
+    """Test that breakpoints are found in the breakpoint window by ID."""
+
+    def setUp(self):
+        self.window = vdebug.ui.vimui.BreakpointWindow(Mock(),"new")
+        self.window.is_open = True
+        self.window.command = Mock()
+        self.window.buffer = BufferMock([""])
+        self.bps = [vdebug.breakpoint.CallBreakpoint(Mock(),"f%i" % i) \
+                for i in range(4)]
+        self.window.ui.breakpoint_store.get_sorted_list.return_value = \
+                self.bps[:3]
+        with patch('vdebug.ui.vimui.vim'):
+            self.window.on_create()
+
+    def __ids(self):
+        return [int(l.split()[0]) for l in self.window.buffer[3:]]
+
+    def test_remove_breakpoint_deletes_its_line(self):
+        self.window.buffer.num_calls = 0
+        self.window.remove_breakpoint(self.bps[1].id)
+        self.assertEqual(self.__ids(),[self.bps[0].id,self.bps[2].id])
+        self.assertEqual(self.window.buffer.num_calls,1)
+
+    def test_remove_unknown_breakpoint(self):
+        self.window.remove_breakpoint(self.bps[3].id)
+        self.assertEqual(len(self.window.buffer),6)
+
+    def test_add_breakpoint_in_order(self):
+        self.window.remove_breakpoint(self.bps[1].id)
+        with patch('vdebug.ui.vimui.vim'):
+            self.window.add_breakpoint(self.bps[3])
+        self.window.add_breakpoint(self.bps[1])
+        self.assertEqual(self.__ids(),[bp.id for bp in self.bps])
+
+class WatchWindowTest(unittest.TestCase):
+    """Test the model of the property tree in the watch window."""
+
+    context = """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="context_get"
+transaction_id="3" context="0"><property name="$a" fullname="$a"
+type="array" children="1" numchildren="1"></property><property name="$b"
+fullname="$b" type="array" children="1" numchildren="2"><property name="x=1"
+fullname="$b['x=1']" type="int"><![CDATA[1]]></property><property name="y"
+fullname="$b['y']" type="array" children="1" numchildren="1"></property></property><property
+name="$c" fullname="$c" type="int"><![CDATA[3]]></property></response>"""
+
+    property_a = """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="property_get"
+transaction_id="4"><property name="$a" fullname="$a" type="array"
+children="1" numchildren="1"><property name="0" fullname="$a[0]"
+type="int"><![CDATA[0]]></property></property></response>"""
+
+    def setUp(self):
+        vdebug.opts.Options.set({'watch_window_style':'expanded',\
+            'marker_default':'*','marker_closed_tree':'+',\
+            'marker_open_tree':'-','marker_load_more':'...',\
+            'watch_window_max_lines':'0'})
+        self.window = vdebug.ui.vimui.WatchWindow(Mock(),"new")
+        self.window.is_open = True
+        self.window.command = Mock()
+        self.window.buffer = BufferMock([""])
+        renderer = vdebug.ui.vimui.ContextGetResponseRenderer(\
+                vdebug.dbgp.ContextGetResponse(self.context,"","",Mock()),\
+                "Title")
+        with patch('vdebug.ui.vimui.vim'):
+            self.window.accept_renderer(renderer)
+
+    def __assert_nodes_match_buffer(self):
+        self.assertEqual(len(self.window.tree.nodes),\
+                len(self.window.buffer))
+        for (i, node) in enumerate(self.window.tree.nodes):
+            if node is not None:
+                self.assertTrue(node.name in self.window.buffer[i])
+
+    def test_lines_map_to_nodes(self):
+        self.assertEqual(self.window.buffer[2]," + $a = (array [1]) ")
+        self.assertEqual(self.window.get_node(3).name,"$a")
+        self.assertIsNone(self.window.get_node(4))
+        node = self.window.get_node(7)
+        self.assertEqual(node.name,"$b['x=1']")
+        self.assertEqual(node.level,1)
+        self.assertEqual(node.parent.name,"$b")
+        self.assertEqual(node.parent.num_lines,6)
+        self.__assert_nodes_match_buffer()
+
+    def test_replace_node_expands_subtree(self):
+        renderer = vdebug.ui.vimui.ContextGetResponseRenderer(\
+                vdebug.dbgp.ContextGetResponse(self.property_a,"","",Mock()))
+        (lines, nodes) = renderer.render_rows(0)
+        self.window.replace_node(3,lines,nodes)
+        self.assertEqual(self.window.buffer[2:8],[\
+                " - $a = (array [1]) ",\
+                "  \\",\
+                "   * $a[0] = (int) 0",\
+                "  /",\
+                " - $b = (array [2]) ",\
+                "  \\"])
+        self.assertTrue(self.window.get_node(3).is_open)
+        self.assertEqual(self.window.get_node(5).parent.name,"$a")
+        self.__assert_nodes_match_buffer()
+
+    def test_collapse_node_removes_known_range(self):
+        self.window.buffer.num_calls = 0
+        self.window.collapse_node(5)
+        self.assertEqual(self.window.buffer[4:8],[\
+                " + $b = (array [2]) ",\
+                " |",\
+                " * $c = (int) 3",\
+                ""])
+        self.assertFalse(self.window.get_node(5).is_open)
+        self.assertEqual(self.window.get_node(5).num_lines,2)
+        self.assertEqual(self.window.buffer.num_calls,1)
+        self.__assert_nodes_match_buffer()
+
+    def __render(self,context):
+        renderer = vdebug.ui.vimui.ContextGetResponseRenderer(\
+                vdebug.dbgp.ContextGetResponse(context,"","",Mock()),\
+                "Title")
+        return (renderer.render_lines(), renderer.line_nodes)
+
+    def test_update_rewrites_changed_rows(self):
+        context = self.context.replace("<![CDATA[3]]>","<![CDATA[4]]>")
+        (lines, nodes) = self.__render(context)
+        self.window.buffer.num_calls = 0
+        self.window.update(lines,nodes)
+        self.assertEqual(self.window.buffer,lines)
+        self.assertEqual(self.window.buffer.num_calls,1)
+        self.assertEqual(self.window.changed,set([10]))
+        self.window.command.assert_called_with(\
+                "call matchadd('debuggerWatchChanged','\\%11l',10,6147)")
+        self.__assert_nodes_match_buffer()
+
+    def test_update_inserts_new_rows(self):
+        context = self.context.replace("</response>",\
+                '<property name="$d" fullname="$d" type="int">'+\
+                '<![CDATA[5]]></property></response>')
+        (lines, nodes) = self.__render(context)
+        self.window.buffer.num_calls = 0
+        self.window.update(lines,nodes)
+        self.assertEqual(self.window.buffer,lines)
+        self.assertEqual(self.window.buffer.num_calls,1)
+        self.assertEqual(self.window.changed,set([12]))
+        self.__assert_nodes_match_buffer()
+
+    def test_update_without_changes(self):
+        (lines, nodes) = self.__render(self.context)
+        self.window.buffer.num_calls = 0
+        self.window.command.reset_mock()
+        self.window.update(lines,nodes)
+        self.assertEqual(self.window.buffer.num_calls,0)
+        self.assertEqual(self.window.changed,set())
+        self.assertFalse(self.window.command.called)
+
+    def test_no_cursor_autocmd_when_all_lines_shown(self):
+        self.assertFalse(mock_called_with(self.window.command,\
+                'au CursorMoved <buffer> '+\
+                'python debugger.handle_watch_cursor_moved()'))
+
+    def test_open_names(self):
+        self.assertEqual(self.window.open_names(),["$b"])
+
+    def test_changed_rows_move_with_replaced_node(self):
+        context = self.context.replace("<![CDATA[3]]>","<![CDATA[4]]>")
+        self.window.update(*self.__render(context))
+        self.window.collapse_node(5)
+        self.assertEqual(self.window.changed,set([6]))
+        self.assertEqual(self.window.get_node(7).name,"$c")
+
+class VirtualWatchWindowTest(unittest.TestCase):
+    """Test that only some of the lines of a large context are put in the
+    watch window's buffer."""
+
+    def setUp(self):
+        vdebug.opts.Options.set({'watch_window_style':'compact',\
+            'marker_default':'*','marker_closed_tree':'+',\
+            'marker_open_tree':'-','marker_load_more':'...',\
+            'watch_window_max_lines':'100'})
+        props = "".join(['<property name="$v%i" fullname="$v%i" '\
+                'type="int"><![CDATA[%i]]></property>' %(i,i,i) \
+                for i in range(1000)])
+        context = '<?xml version="1.0" encoding="iso-8859-1"?>'+\
+                '<response xmlns="urn:debugger_protocol_v1" '+\
+                'command="context_get" transaction_id="3" context="0">'+\
+                props + '</response>'
+        self.window = vdebug.ui.vimui.WatchWindow(Mock(),"new")
+        self.window.is_open = True
+        self.window.command = Mock()
+        self.window.buffer = BufferMock([""])
+        renderer = vdebug.ui.vimui.ContextGetResponseRenderer(\
+                vdebug.dbgp.ContextGetResponse(context,"","",Mock()),\
+                "Title")
+        with patch('vdebug.ui.vimui.vim'):
+            self.window.accept_renderer(renderer)
+
+    def test_buffer_has_max_lines_and_placeholder(self):
+        self.assertEqual(len(self.window.lines),1003)
+        self.assertEqual(len(self.window.buffer),101)
+        self.assertEqual(self.window.buffer[:100],self.window.lines[:100])
+        self.assertEqual(self.window.buffer[100],"  [903 more lines below]")
+        self.assertEqual(self.window.get_line_index(1),0)
+        self.assertEqual(self.window.get_node(3).name,"$v0")
+        self.assertIsNone(self.window.get_node(101))
+
+    def test_cursor_autocmd_added_once(self):
+        au = 'au CursorMoved <buffer> '+\
+                'python debugger.handle_watch_cursor_moved()'
+        self.window.command.assert_any_call(au)
+        self.window.command.reset_mock()
+        self.window.show_line(900)
+        self.assertFalse(mock_called_with(self.window.command,au))
+
+    def test_follow_cursor_moves_lines(self):
+        with patch('vdebug.ui.vimui.vim') as vim:
+            vim.current.window.cursor = (95,0)
+            self.window.follow_cursor()
+        self.assertEqual(self.window.first,44)
+        self.assertEqual(self.window.buffer[0],"  [44 more lines above]")
+        self.assertEqual(len(self.window.buffer),102)
+        self.assertEqual(self.window.get_node(52).name,"$v92")
+        self.window.command.assert_called_with('call cursor(52,col("."))')
+
+    def test_follow_cursor_away_from_placeholder(self):
+        self.window.buffer.num_calls = 0
+        with patch('vdebug.ui.vimui.vim') as vim:
+            vim.current.window.cursor = (50,0)
+            self.window.follow_cursor()
+        self.assertEqual(self.window.first,0)
+        self.assertEqual(self.window.buffer.num_calls,0)
+
+    def test_search_shows_matching_line(self):
+        self.assertTrue(self.window.search("v900 =",3))
+        self.assertEqual(self.window.first,852)
+        lineno = self.window.get_lineno(902)
+        self.assertEqual(self.window.get_node(lineno).name,"$v900")
+        self.assertTrue(len(self.window.buffer) <= 102)
+        self.assertFalse(self.window.search("nothing",lineno))
+
+    def test_replace_node_keeps_buffer_bounded(self):
+        renderer = vdebug.ui.vimui.ContextGetResponseRenderer(\
+                vdebug.dbgp.ContextGetResponse(WatchWindowTest.property_a,\
+                "","",Mock()))
+        (lines, nodes) = renderer.render_rows(0)
+        self.window.search("v500 =",1)
+        lineno = self.window.get_lineno(502)
+        self.window.buffer.num_calls = 0
+        self.window.replace_node(lineno,lines,nodes)
+        self.assertEqual(len(self.window.lines),1004)
+        self.assertEqual(len(self.window.buffer),102)
+        self.assertEqual(self.window.buffer.num_calls,1)
+        self.assertEqual(self.window.get_node(lineno).name,"$a")
+        self.assertEqual(self.window.get_node(lineno+1).name,"$a[0]")